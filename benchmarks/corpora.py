@@ -0,0 +1,98 @@
+"""Generators of synthetic documents and modules for the benchmarks
+
+All generators are deterministic, so runs on different versions of the plugin are
+comparable.
+"""
+
+import typing
+
+
+def many_fences(count: int = 10_000) -> str:
+    """A markdown document with `count` python fences, with some prose and options"""
+    parts = ["# Reference\n\n"]
+    for i in range(count):
+        parts.append(f"## Section {i}\n\nSome text about `value_{i}` and *more*.\n\n")
+        if i % 10 == 0:
+            parts.append(f"```python fixture:tmp_path retry:{i % 3}\n")
+        elif i % 10 == 1:
+            parts.append("```{.python .annotate title='example.py'}\n")
+        else:
+            parts.append("```python\n")
+        parts.append(f"value_{i} = {i}\nassert value_{i} + 1 == {i + 1}\n```\n\n")
+        if i % 5 == 0:
+            parts.append("```js\nconsole.log('not python')\n```\n\n")
+    return "".join(parts)
+
+
+def continuation_chain(depth: int = 2_000) -> str:
+    """A markdown document with a single continuation chain of `depth` fences"""
+    parts = ["```python\ntotal = 0\n```\n\n"]
+    for i in range(1, depth):
+        parts.append(f"Step {i}\n\n```python continuation\ntotal += {i}\n```\n\n")
+    return "".join(parts)
+
+
+def heavy_jsx_mdx(count: int = 2_000) -> str:
+    """An MDX document with fences between JSX components and metadata comments"""
+    parts = ["import { Tabs, Tab } from './components'\n\n"]
+    for i in range(count):
+        parts.append(
+            f'<Tabs groupId="example-{i}">\n'
+            f'  <Tab value="python" label="Python {i}">\n\n'
+            f"{{/* pmd-metadata: {'continuation' if i % 2 else 'notest'} */}}\n"
+            "```python\n"
+            f"x_{i} = {i}\n"
+            "```\n\n"
+            "  </Tab>\n"
+            "</Tabs>\n\n"
+            f'<Callout type="info">Note {{props.value_{i}}}</Callout>\n\n'
+        )
+    return "".join(parts)
+
+
+def superfences_info_strings(count: int = 50_000) -> typing.List[str]:
+    """Fence info strings in the default and PyMdown Superfences syntaxes"""
+    templates = [
+        "python",
+        "python continuation fixture:capsys",
+        "{.python .annotate title='example.py' linenums='1'}",
+        "{ #example .python continuation hl_lines='2 3' }",
+        "py retry:3 timeout:2.5",
+    ]
+    return [templates[i % len(templates)] for i in range(count)]
+
+
+def many_docstrings(count: int = 2_000) -> str:
+    """Source of a module with `count` classes and functions with a fence each"""
+    parts = ['"""Generated module\n\n```python\nassert True\n```\n"""\n\n']
+    for i in range(count):
+        if i % 2:
+            parts.append(
+                f"class Class{i}:\n"
+                f'    """Class {i}\n\n'
+                "    ```python\n"
+                f"    assert {i} == {i}\n"
+                '    ```\n    """\n\n'
+                "    @property\n"
+                "    def value(self):\n"
+                f"        return {i}\n\n\n"
+            )
+        else:
+            parts.append(
+                f"def function_{i}():\n"
+                f'    """Function {i}\n\n'
+                "    ```python\n"
+                f"    assert {i} == {i}\n"
+                '    ```\n    """\n\n\n'
+            )
+    return "".join(parts)
+
+
+def trivial_fences(count: int) -> str:
+    """A markdown document with `count` fences that do (almost) nothing"""
+    return "".join("```python\npass\n```\n\n" for _ in range(count))
+
+
+def trivial_tests(count: int) -> str:
+    """Source of a test module with `count` test functions that do nothing"""
+    return "".join(f"def test_{i}():\n    pass\n\n\n" for i in range(count))
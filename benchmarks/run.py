@@ -0,0 +1,344 @@
+"""Benchmarks of the plugin's collection and execution hot paths
+
+Usage:
+
+    python benchmarks/run.py                        # run all benchmarks
+    python benchmarks/run.py -k extract             # run benchmarks matching "extract"
+    python benchmarks/run.py --save baseline.json   # save the results as a baseline
+    python benchmarks/run.py --compare baseline.json
+
+With --compare, metrics that got worse than the baseline by more than --threshold are
+reported as regressions, and the exit code is 1.
+"""
+
+import argparse
+import importlib.util
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+
+from markdown_it import MarkdownIt
+
+import corpora
+from pytest_markdown_docs._runners import compile_blocks
+from pytest_markdown_docs.plugin import (
+    FenceParser,
+    FenceSyntax,
+    extract_fence_tests,
+    find_docstrings_in_module,
+    find_object_tests_in_source,
+    object_tests_from_docstrings,
+    parse_superfences_block_info,
+)
+
+Metrics = typing.Dict[str, float]
+# a benchmark prepares its input and returns a function doing the measured work, which
+# returns the number of fences and bytes it processed
+Benchmark = typing.Callable[[pathlib.Path], typing.Callable[[], typing.Tuple[int, int]]]
+
+BENCHMARKS: typing.Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> typing.Callable[[Benchmark], Benchmark]:
+    def register(setup: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _extract(
+    markdown_string: str,
+    fence_parser: FenceParser,
+    markdown_type: str = "md",
+    fence_syntax: FenceSyntax = FenceSyntax.default,
+) -> typing.Callable[[], typing.Tuple[int, int]]:
+    parser = MarkdownIt(config="commonmark")
+    size = len(markdown_string.encode("utf8"))
+
+    def run():
+        fence_tests = list(
+            extract_fence_tests(
+                parser,
+                markdown_string,
+                0,
+                pathlib.Path(f"bench.{markdown_type}"),
+                markdown_type=markdown_type,
+                fence_syntax=fence_syntax,
+                fence_parser=fence_parser,
+            )
+        )
+        return len(fence_tests), size
+
+    return run
+
+
+@benchmark("extract/markdown-it/many-fences")
+def _(tmp: pathlib.Path):
+    return _extract(corpora.many_fences(), FenceParser.markdown_it)
+
+
+@benchmark("extract/fast/many-fences")
+def _(tmp: pathlib.Path):
+    return _extract(corpora.many_fences(), FenceParser.fast)
+
+
+@benchmark("extract/superfences/many-fences")
+def _(tmp: pathlib.Path):
+    return _extract(
+        corpora.many_fences(),
+        FenceParser.markdown_it,
+        fence_syntax=FenceSyntax.superfences,
+    )
+
+
+@benchmark("extract/markdown-it/continuation-chain")
+def _(tmp: pathlib.Path):
+    return _extract(corpora.continuation_chain(), FenceParser.markdown_it)
+
+
+@benchmark("compile/continuation-chain")
+def _(tmp: pathlib.Path):
+    fence_tests = list(
+        extract_fence_tests(
+            MarkdownIt(config="commonmark"),
+            corpora.continuation_chain(),
+            0,
+            pathlib.Path("bench.md"),
+        )
+    )
+
+    def run():
+        # compiling every fence's chain is quadratic - compile every 100th
+        compiled = 0
+        for fence_test in fence_tests[::100]:
+            compile_blocks(fence_test.chain, "bench.md", 0)
+            compiled += len(fence_test.chain)
+        return compiled, 0
+
+    return run
+
+
+@benchmark("extract/mdx/heavy-jsx")
+def _(tmp: pathlib.Path):
+    return _extract(corpora.heavy_jsx_mdx(), FenceParser.markdown_it, "mdx")
+
+
+@benchmark("parse/superfences-info")
+def _(tmp: pathlib.Path):
+    info_strings = corpora.superfences_info_strings()
+    size = sum(len(info.encode("utf8")) for info in info_strings)
+
+    def run():
+        for info in info_strings:
+            parse_superfences_block_info(info)
+        return len(info_strings), size
+
+    return run
+
+
+@benchmark("docstrings/static")
+def _(tmp: pathlib.Path):
+    source = corpora.many_docstrings().encode("utf8")
+    parser = MarkdownIt(config="commonmark")
+
+    def run():
+        object_tests = list(
+            find_object_tests_in_source(
+                source,
+                "bench_module",
+                pathlib.Path("bench_module.py"),
+                parser,
+                FenceSyntax.default,
+                FenceParser.markdown_it,
+            )
+        )
+        return len(object_tests), len(source)
+
+    return run
+
+
+@benchmark("docstrings/import")
+def _(tmp: pathlib.Path):
+    path = tmp / "bench_imported_module.py"
+    path.write_text(corpora.many_docstrings())
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    parser = MarkdownIt(config="commonmark")
+
+    def run():
+        source = path.read_bytes()
+        object_tests = list(
+            object_tests_from_docstrings(
+                find_docstrings_in_module(module, source),
+                path,
+                parser,
+                FenceSyntax.default,
+                FenceParser.markdown_it,
+            )
+        )
+        return len(object_tests), len(source)
+
+    return run
+
+
+def _measure(run: typing.Callable[[], typing.Tuple[int, int]], repeat: int) -> Metrics:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fences, size = run()
+        best = min(best, time.perf_counter() - start)
+    # measured separately, since tracing allocations slows everything down
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    metrics = {"seconds": best, "fences_per_second": fences / best}
+    if size:
+        metrics["bytes_per_second"] = size / best
+    metrics["peak_memory_mb"] = peak / 1e6
+    return metrics
+
+
+def _pytest_seconds(directory: pathlib.Path, *args: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", *args],
+        cwd=directory,
+        check=True,
+        capture_output=True,
+    )
+    return time.perf_counter() - start
+
+
+def measure_item_overhead(tmp: pathlib.Path, count: int, repeat: int) -> Metrics:
+    """Time per fence test vs per plain pytest function, running pytest in a subprocess"""
+    (tmp / "fences.md").write_text(corpora.trivial_fences(count))
+    (tmp / "test_plain.py").write_text(corpora.trivial_tests(count))
+    fences = min(
+        _pytest_seconds(tmp, "--markdown-docs", "fences.md") for _ in range(repeat)
+    )
+    plain = min(
+        _pytest_seconds(tmp, "--markdown-docs", "test_plain.py") for _ in range(repeat)
+    )
+    return {
+        "fence_item_us": fences / count * 1e6,
+        "plain_item_us": plain / count * 1e6,
+        "overhead_per_item_us": (fences - plain) / count * 1e6,
+    }
+
+
+def run_benchmarks(
+    selection: typing.Optional[str], repeat: int, items: int
+) -> typing.Dict[str, Metrics]:
+    results: typing.Dict[str, Metrics] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, setup in BENCHMARKS.items():
+            if selection and selection not in name:
+                continue
+            results[name] = _measure(setup(pathlib.Path(tmp)), repeat)
+            print(_format(name, results[name]), flush=True)
+        name = "runtest/item-overhead"
+        if not selection or selection in name:
+            results[name] = measure_item_overhead(pathlib.Path(tmp), items, repeat)
+            print(_format(name, results[name]), flush=True)
+    return results
+
+
+def _format_value(metric: str, value: float) -> str:
+    if metric.endswith("_per_second"):
+        return f"{value:,.0f}/s"
+    if metric == "seconds":
+        return f"{value * 1000:.1f}ms"
+    if metric.endswith("_mb"):
+        return f"{value:.1f}MB"
+    return f"{value:.1f}us"
+
+
+def _format(name: str, metrics: Metrics) -> str:
+    values = ", ".join(
+        f"{metric} {_format_value(metric, value)}" for metric, value in metrics.items()
+    )
+    return f"{name}: {values}"
+
+
+def _higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_second")
+
+
+def compare(
+    results: typing.Dict[str, Metrics],
+    baseline: typing.Dict[str, Metrics],
+    threshold: float,
+) -> typing.List[str]:
+    """Print the changes vs the baseline, returning the metrics that regressed"""
+    regressions = []
+    print("\nchanges vs baseline:")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if not previous or metric == "overhead_per_item_us":
+                # overheads can be close to (or below) zero, so relative changes of
+                # them are meaningless - the per item times are compared instead
+                continue
+            if metric.endswith("_mb") and max(value, previous) < 1:
+                # too small for relative changes to be meaningful
+                continue
+            change = (value - previous) / previous
+            worse = -change if _higher_is_better(metric) else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{name} {metric}")
+            print(
+                f"  {name} {metric}: {_format_value(metric, previous)} -> "
+                f"{_format_value(metric, value)} ({change:+.1%}){flag}"
+            )
+    return regressions
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-k", dest="selection", help="only run matching benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark")
+    parser.add_argument(
+        "--items", type=int, default=2000, help="tests in the per item overhead run"
+    )
+    parser.add_argument("--save", type=pathlib.Path, help="save results to a file")
+    parser.add_argument(
+        "--compare", type=pathlib.Path, help="compare results to a saved baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change counted as a regression (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+
+    print(f"python {platform.python_version()} on {platform.platform()}")
+    results = run_benchmarks(args.selection, args.repeat, args.items)
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    if args.compare:
+        regressions = compare(
+            results, json.loads(args.compare.read_text()), args.threshold
+        )
+        if regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import hashlib
+import pathlib
+import subprocess
+import time
+import typing
+
+import pytest
+
+from pytest_markdown_docs.definitions import FenceTestDefinition
+
+MANIFEST_CACHE_KEY = "markdown-docs/manifest"
+# fences that haven't passed for this long are considered changed again
+MANIFEST_MAX_AGE = 90 * 24 * 60 * 60
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+
+def fence_signature(
+    context: str,
+    previous_signature: typing.Optional[str],
+    fence_test: FenceTestDefinition,
+) -> str:
+    """A hash of everything a fence's outcome depends on within its file
+
+    That is the fence's content and, for continuation blocks, the signature of the
+    block it continues. The context identifies the file (and docstring) of the fence.
+    Line numbers aren't part of it, so fences moving around within a file keep their
+    signature.
+    """
+    if fence_test.continuation and previous_signature is not None:
+        context = previous_signature
+    return content_digest(f"{context}\0{fence_test.block_digest}")
+
+
+def fence_signatures(
+    context: str, fence_tests: typing.Iterable[FenceTestDefinition]
+) -> typing.Iterator[str]:
+    """Signatures of the fences in a markdown file or docstring, in order"""
+    signature = None
+    for fence_test in fence_tests:
+        signature = fence_signature(context, signature, fence_test)
+        yield signature
+
+
+class ChangeManifest:
+    """Signatures of the fences that passed in previous runs, kept in the pytest cache"""
+
+    def __init__(self, cache: pytest.Cache):
+        self.cache = cache
+        self.previous: typing.Dict[str, float] = cache.get(MANIFEST_CACHE_KEY, {})
+        self.passed: typing.Set[str] = set()
+        self.failed: typing.Set[str] = set()
+
+    def __contains__(self, signature: str) -> bool:
+        return signature in self.previous
+
+    def save(self) -> None:
+        if not self.passed and not self.failed:
+            return
+        now = time.time()
+        manifest = {
+            signature: timestamp
+            for signature, timestamp in self.previous.items()
+            if now - timestamp < MANIFEST_MAX_AGE and signature not in self.failed
+        }
+        manifest.update(dict.fromkeys(self.passed - self.failed, now))
+        self.cache.set(MANIFEST_CACHE_KEY, manifest)
+
+
+class GitChanges:
+    """Files changed in the working tree (including untracked ones) since a git ref"""
+
+    def __init__(self, directory: pathlib.Path, ref: str):
+        self.ref = ref
+        self.toplevel = pathlib.Path(
+            self._git(directory, "rev-parse", "--show-toplevel").strip()
+        ).resolve()
+        self._git(directory, "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}")
+        changed = self._git(self.toplevel, "diff", "--name-only", "-z", ref, "--")
+        untracked = self._git(
+            self.toplevel, "ls-files", "--others", "--exclude-standard", "-z"
+        )
+        self.changed = {
+            self.toplevel / name for name in (changed + untracked).split("\0") if name
+        }
+
+    @staticmethod
+    def _git(directory: pathlib.Path, *args: str) -> str:
+        try:
+            return subprocess.run(
+                ["git", *args],
+                cwd=directory,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", None) or str(e)
+            raise pytest.UsageError(
+                f"--markdown-docs-changed: git {' '.join(args)} failed: {stderr.strip()}"
+            )
+
+    def is_changed(self, path: pathlib.Path) -> bool:
+        return path.resolve() in self.changed
+
+    def old_source(self, path: pathlib.Path) -> typing.Optional[str]:
+        """The content of a file at the git ref, or None if it didn't exist there"""
+        relative_path = path.resolve().relative_to(self.toplevel)
+        result = subprocess.run(
+            ["git", "show", f"{self.ref}:{relative_path.as_posix()}"],
+            cwd=self.toplevel,
+            capture_output=True,
+        )
+        if result.returncode != 0:
+            return None
+        return result.stdout.decode("utf8")
@@ -0,0 +1,236 @@
+import dataclasses
+import hashlib
+import json
+import pathlib
+import typing
+
+import pytest
+
+from pytest_markdown_docs.definitions import (
+    FenceBlock,
+    FenceTestDefinition,
+    FileSlice,
+    ObjectTestDefinition,
+)
+
+if typing.TYPE_CHECKING:
+    from markdown_it import MarkdownIt
+
+# bump whenever the serialized format or the extraction logic changes
+CACHE_FORMAT_VERSION = 7
+CACHE_KEY_PREFIX = "markdown-docs/collection"
+
+
+def parser_fingerprint(markdown_it_parser: "MarkdownIt", *extra: str) -> str:
+    """Describe a parser configuration, so cached results from other configurations are ignored"""
+
+    def describe(value):
+        # e.g. a `highlight` function - the repr would change on every run
+        return getattr(value, "__qualname__", type(value).__qualname__)
+
+    parser_type = type(markdown_it_parser)
+    description = json.dumps(
+        [
+            CACHE_FORMAT_VERSION,
+            f"{parser_type.__module__}.{parser_type.__qualname__}",
+            dict(markdown_it_parser.options),
+            markdown_it_parser.get_active_rules(),
+            extra,
+        ],
+        sort_keys=True,
+        default=describe,
+    )
+    return hashlib.sha256(description.encode("utf8")).hexdigest()
+
+
+def _block_to_json(block: FenceBlock) -> typing.List[typing.Any]:
+    if block.file_slice is None:
+        return [block.text, block.start_line]
+    # blocks read lazily stay lazy - the file is unchanged when the entry is used
+    file_slice = block.file_slice
+    return [
+        None,
+        block.start_line,
+        [str(file_slice.path), file_slice.offset, file_slice.length],
+        block.text_digest,
+    ]
+
+
+def _block_from_json(data: typing.List[typing.Any]) -> FenceBlock:
+    if data[0] is not None:
+        return FenceBlock(data[0], data[1])
+    path, offset, length = data[2]
+    return FenceBlock(
+        None, data[1], FileSlice(pathlib.Path(path), offset, length), data[3]
+    )
+
+
+class _BlocksTable:
+    """The shared block lists of fence tests, serialized once each"""
+
+    def __init__(self) -> None:
+        self.indices: typing.Dict[int, int] = {}
+        self.blocks: typing.List[typing.List[typing.Any]] = []
+
+    def add(self, blocks: typing.Sequence[FenceBlock]) -> int:
+        if id(blocks) not in self.indices:
+            self.indices[id(blocks)] = len(self.blocks)
+            self.blocks.append([_block_to_json(block) for block in blocks])
+        return self.indices[id(blocks)]
+
+
+def _fence_test_to_json(
+    fence_test: FenceTestDefinition, blocks_table: _BlocksTable
+) -> typing.Dict[str, typing.Any]:
+    data = {
+        field.name: getattr(fence_test, field.name)
+        for field in dataclasses.fields(fence_test)
+    }
+    data["blocks"] = blocks_table.add(fence_test.blocks)
+    data["fixture_names"] = list(fence_test.fixture_names)
+    data["source_path"] = str(fence_test.source_path)
+    return data
+
+
+def _fence_test_from_json(
+    data: typing.Dict[str, typing.Any], blocks: typing.List[typing.List[FenceBlock]]
+) -> FenceTestDefinition:
+    return FenceTestDefinition(
+        **{
+            **data,
+            "blocks": blocks[data["blocks"]],
+            "fixture_names": tuple(data["fixture_names"]),
+            "source_path": pathlib.Path(data["source_path"]),
+        }
+    )
+
+
+def _blocks_from_json(
+    data: typing.Dict[str, typing.Any],
+) -> typing.List[typing.List[FenceBlock]]:
+    return [[_block_from_json(block) for block in blocks] for blocks in data["blocks"]]
+
+
+def fence_tests_to_json(
+    fence_tests: typing.Sequence[FenceTestDefinition],
+) -> typing.Dict[str, typing.Any]:
+    blocks_table = _BlocksTable()
+    tests = [
+        _fence_test_to_json(fence_test, blocks_table) for fence_test in fence_tests
+    ]
+    return {"blocks": blocks_table.blocks, "tests": tests}
+
+
+def fence_tests_from_json(
+    data: typing.Dict[str, typing.Any],
+) -> typing.List[FenceTestDefinition]:
+    blocks = _blocks_from_json(data)
+    return [_fence_test_from_json(test, blocks) for test in data["tests"]]
+
+
+def object_tests_to_json(
+    object_tests: typing.Sequence[ObjectTestDefinition],
+) -> typing.Dict[str, typing.Any]:
+    blocks_table = _BlocksTable()
+    tests = [
+        {
+            "intra_object_index": object_test.intra_object_index,
+            "object_name": object_test.object_name,
+            "fence_test": _fence_test_to_json(object_test.fence_test, blocks_table),
+            "docstring_digest": object_test.docstring_digest,
+        }
+        for object_test in object_tests
+    ]
+    return {"blocks": blocks_table.blocks, "tests": tests}
+
+
+def object_tests_from_json(
+    data: typing.Dict[str, typing.Any],
+) -> typing.List[ObjectTestDefinition]:
+    blocks = _blocks_from_json(data)
+    return [
+        ObjectTestDefinition(
+            test["intra_object_index"],
+            test["object_name"],
+            _fence_test_from_json(test["fence_test"], blocks),
+            test["docstring_digest"],
+        )
+        for test in data["tests"]
+    ]
+
+
+@dataclasses.dataclass(frozen=True)
+class FileStamp:
+    path: pathlib.Path
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+class CollectionCache:
+    """Extracted fence tests per file, stored in the pytest cache
+
+    Entries are keyed by file path and only reused if the parser fingerprint matches
+    and the file is unchanged: either its size and mtime are the same as when the
+    entry was stored, or its content hash is.
+    """
+
+    def __init__(self, cache: pytest.Cache, fingerprint: str):
+        self.cache = cache
+        self.fingerprint = fingerprint
+
+    def _key(self, path: pathlib.Path) -> str:
+        path_hash = hashlib.sha256(str(path).encode("utf8")).hexdigest()
+        return f"{CACHE_KEY_PREFIX}/{path_hash}"
+
+    def load(
+        self, path: pathlib.Path
+    ) -> typing.Tuple[typing.Optional[typing.Dict[str, typing.Any]], FileStamp]:
+        """Return the cached tests for a file (or None) and a stamp to store new tests with"""
+        stat = path.stat()
+        entry = self.cache.get(self._key(path), None)
+        if entry and entry.get("fingerprint") != self.fingerprint:
+            entry = None
+
+        if (
+            entry
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            stamp = FileStamp(path, stat.st_size, stat.st_mtime_ns, entry["digest"])
+            return entry["tests"], stamp
+
+        # hashed before the file is parsed, so a concurrent modification
+        # can't end up stored as the digest of the parsed content
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        stamp = FileStamp(path, stat.st_size, stat.st_mtime_ns, digest)
+        if not entry or entry["digest"] != digest:
+            return None, stamp
+
+        # same content, e.g. after a fresh checkout - refresh the stat info
+        self.store(stamp, entry["tests"])
+        return entry["tests"], stamp
+
+    def store(self, stamp: FileStamp, tests: typing.Dict[str, typing.Any]) -> None:
+        self.cache.set(
+            self._key(stamp.path),
+            {
+                "fingerprint": self.fingerprint,
+                "size": stamp.size,
+                "mtime_ns": stamp.mtime_ns,
+                "digest": stamp.digest,
+                "tests": tests,
+            },
+        )
+
+
+def get_collection_cache(
+    config: pytest.Config, markdown_it_parser: "MarkdownIt", *extra: str
+) -> typing.Optional[CollectionCache]:
+    if not config.option.markdowndocs_collection_cache:
+        return None
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        # the cacheprovider plugin is disabled
+        return None
+    return CollectionCache(cache, parser_fingerprint(markdown_it_parser, *extra))
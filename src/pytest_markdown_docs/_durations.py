@@ -0,0 +1,129 @@
+import dataclasses
+import statistics
+import typing
+
+import pytest
+
+DURATIONS_CACHE_KEY = "markdown-docs/durations"
+# number of runs kept per code fence, for showing trends
+MAX_RUNS = 10
+
+
+@dataclasses.dataclass
+class FenceDurations:
+    """Setup, call and teardown durations of a code fence in the current session"""
+
+    nodeid: str
+    # node ids of the file and of the first fence of the continuation chain
+    file: str
+    chain: str
+    fixtures: typing.Tuple[str, ...]
+    phases: typing.Dict[str, float] = dataclasses.field(default_factory=dict)
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+
+class DurationHistory:
+    """Durations of code fence tests, keyed by fence identity and kept in the pytest cache
+
+    Fence identities are based on the file and the fence content rather than on node
+    ids, so history survives fences moving around within a file. Entries of fences
+    that didn't run in the current session (e.g. deselected ones) are kept.
+    """
+
+    def __init__(self, cache: pytest.Cache):
+        self.cache = cache
+        self.previous: typing.Dict[str, typing.Dict[str, typing.Any]] = cache.get(
+            DURATIONS_CACHE_KEY, {}
+        )
+        self.current: typing.Dict[str, FenceDurations] = {}
+
+    def get(self, fence_id: str) -> typing.Optional[float]:
+        """The total duration of a code fence in its most recent run"""
+        if fence_id in self.current:
+            return self.current[fence_id].total
+        runs = self.previous.get(fence_id, {}).get("runs")
+        return runs[-1] if runs else None
+
+    def previous_mean(self, fence_id: str) -> typing.Optional[float]:
+        runs = self.previous.get(fence_id, {}).get("runs")
+        return statistics.mean(runs) if runs else None
+
+    def add(self, fence: typing.Dict[str, typing.Any], when: str, duration: float):
+        durations = self.current.get(fence["id"])
+        if durations is None:
+            durations = self.current[fence["id"]] = FenceDurations(
+                fence["nodeid"], fence["file"], fence["chain"], tuple(fence["fixtures"])
+            )
+        durations.phases[when] = durations.phases.get(when, 0.0) + duration
+
+    def save(self) -> None:
+        if not self.current:
+            return
+        data = dict(self.previous)
+        for fence_id, durations in self.current.items():
+            runs = self.previous.get(fence_id, {}).get("runs", [])
+            data[fence_id] = {
+                "nodeid": durations.nodeid,
+                "phases": durations.phases,
+                "runs": (runs + [durations.total])[-MAX_RUNS:],
+            }
+        self.cache.set(DURATIONS_CACHE_KEY, data)
+
+    def _trend(self, total: float, previous: typing.Optional[float]) -> str:
+        if not previous:
+            return "new"
+        return f"{(total - previous) / previous:+.0%} vs {previous:.2f}s"
+
+    def summary(self, count: int) -> typing.List[str]:
+        """Lines listing the slowest fences, files, chains and fixture sets
+
+        Lists the `count` slowest entries of each kind, or all of them for 0.
+        """
+
+        def top(entries):
+            entries = sorted(entries, key=lambda entry: entry[0], reverse=True)
+            return entries[:count] if count else entries
+
+        lines = ["slowest code fences:"]
+        for total, fence_id, durations in top(
+            (durations.total, fence_id, durations)
+            for fence_id, durations in self.current.items()
+        ):
+            phases = ", ".join(
+                f"{when} {durations.phases[when]:.2f}s"
+                for when in ("setup", "call", "teardown")
+                if when in durations.phases
+            )
+            trend = self._trend(total, self.previous_mean(fence_id))
+            lines.append(f"{total:8.2f}s ({trend}) {durations.nodeid} ({phases})")
+
+        groups: typing.Dict[str, typing.Callable[[FenceDurations], typing.Any]] = {
+            "files": lambda durations: durations.file,
+            "continuation chains": lambda durations: durations.chain,
+            "fixture sets": lambda durations: ", ".join(durations.fixtures)
+            or "(no fixtures)",
+        }
+        for title, group_by in groups.items():
+            totals: typing.Dict[str, typing.List[float]] = {}
+            previous_totals: typing.Dict[str, float] = {}
+            for fence_id, durations in self.current.items():
+                name = group_by(durations)
+                totals.setdefault(name, []).append(durations.total)
+                previous_totals[name] = previous_totals.get(name, 0.0) + (
+                    self.previous_mean(fence_id) or 0.0
+                )
+            if title == "continuation chains":
+                # a "chain" of a single fence is just the fence
+                totals = {name: ts for name, ts in totals.items() if len(ts) > 1}
+            lines.append(f"slowest {title}:")
+            for total, name, fence_count in top(
+                (sum(ts), name, len(ts)) for name, ts in totals.items()
+            ):
+                trend = self._trend(total, previous_totals[name])
+                lines.append(
+                    f"{total:8.2f}s ({trend}) {name} ({fence_count} code fences)"
+                )
+        return lines
@@ -0,0 +1,511 @@
+"""A line-oriented scanner for fenced code blocks
+
+This is a much faster alternative to tokenizing documents with markdown-it when all we
+need are the fenced code blocks, their info strings and positions. It follows the
+CommonMark rules (as implemented by markdown-it's "commonmark" preset) for everything
+that decides whether a line is part of a fence: indentation, fence lengths and
+characters, indented code blocks, HTML blocks and fences nested in block quotes and
+list items.
+
+Known differences to markdown-it:
+* tabs in indentation are counted as a single column
+* link reference definitions are treated as regular paragraphs
+* markdown-it plugins (e.g. admonitions) are not supported
+
+Parity with markdown-it is checked by a differential test in tests/fence_scanner_test.py.
+"""
+
+import array
+import re
+import typing
+
+from markdown_it.rules_block.html_block import HTML_SEQUENCES
+
+
+class Fence(typing.NamedTuple):
+    info: str
+    content: str
+    # line index (0-based) of the opening fence
+    line: int
+    # the inline content of a paragraph or heading directly preceding the fence,
+    # used for looking up MDX metadata comments
+    preceding_inline: typing.Optional[str]
+    # for fences scanned lazily (see scan_fences_lazily) and not nested in any
+    # container, the byte range of the content in the buffer - content is empty then
+    span: typing.Optional[typing.Tuple[int, int]] = None
+
+
+class MarkdownChunk(typing.NamedTuple):
+    # line index (0-based) of the chunk's first line in the document
+    line: int
+    text: str
+    # the preceding_inline of a fence at the start of the chunk (see Fence)
+    preceding_inline: typing.Optional[str]
+
+
+_fence_open_re = re.compile(r"^( {0,3})(`{3,}|~{3,})(.*)$")
+_atx_heading_re = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+_thematic_break_re = re.compile(
+    r"^ {0,3}(?:(?:\*[ \t]*){3,}|(?:-[ \t]*){3,}|(?:_[ \t]*){3,})$"
+)
+_setext_underline_re = re.compile(r"^ {0,3}(?:=+|-+)[ \t]*$")
+_blockquote_re = re.compile(r"^ {0,3}> ?")
+# markdown-it accepts continuation markers at any indentation
+_blockquote_continuation_re = re.compile(r"^[ \t]*> ?")
+_list_item_re = re.compile(r"^( {0,3})([-+*]|(\d{1,9})[.)])(?:( +)(.*)|$)")
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" \t"))
+
+
+class _ListItem:
+    def __init__(self, content_indent: int, starts_blank: bool):
+        self.content_indent = content_indent
+        # a list item can begin with at most one blank line
+        self.starts_blank = starts_blank
+
+
+class _BlockQuote:
+    pass
+
+
+_Container = typing.Union[_ListItem, _BlockQuote]
+
+
+class _OpenFence:
+    def __init__(
+        self,
+        char: str,
+        length: int,
+        indent: int,
+        info: str,
+        line: int,
+        preceding_inline: typing.Optional[str],
+        verbatim: bool,
+    ):
+        self.char = char
+        self.length = length
+        self.indent = indent
+        self.info = info
+        self.line = line
+        self.preceding_inline = preceding_inline
+        # if the content lines are the document lines as they are - then they
+        # are only counted, not kept
+        self.verbatim = verbatim
+        self.content: typing.List[str] = []
+        self.line_count = 0
+
+    def is_closed_by(self, rest: str) -> bool:
+        if _indent(rest) >= 4:
+            return False
+        marker = rest.strip(" \t")
+        return len(marker) >= self.length and marker == self.char * len(marker)
+
+
+def _match_fence_open(rest: str) -> typing.Optional[typing.Match[str]]:
+    m = _fence_open_re.match(rest)
+    if m and m.group(2)[0] == "`" and "`" in m.group(3):
+        # backtick fences can't have backticks in their info string
+        return None
+    return m
+
+
+def _interrupts(text: str) -> bool:
+    """If an unindented line would start a block ending a lazy paragraph continuation
+
+    Unlike when interrupting a paragraph in the same container, any list item does.
+    """
+    if (
+        _match_fence_open(text)
+        or _atx_heading_re.match(text)
+        or _thematic_break_re.match(text)
+        or _blockquote_re.match(text)
+        or _list_item_re.match(text)
+    ):
+        return True
+    if text.startswith("<"):
+        for start, _, can_interrupt in HTML_SEQUENCES:
+            if start.search(text):
+                return can_interrupt
+    return False
+
+
+class FenceScanner:
+    """Incremental fence scanner - feed it lines and it returns the fences they close
+
+    In lazy mode, the content of fences that aren't indented or nested in any
+    container isn't kept, and the fences are returned with the span of their content
+    lines instead (as line indices, see scan_fences_lazily).
+    """
+
+    def __init__(self, lazy: bool = False) -> None:
+        self.lazy = lazy
+        self.line_index = 0
+        self._containers: typing.List[_Container] = []
+        self._fence: typing.Optional[_OpenFence] = None
+        self._fence_depth = 0
+        self._html_end: typing.Optional[typing.Pattern[str]] = None
+        self._html_depth = 0
+        self._paragraph: typing.Optional[typing.List[str]] = None
+        self._preceding_inline: typing.Optional[str] = None
+
+    def _match_containers(self, line: str) -> typing.Tuple[int, str, str]:
+        """Match the line against the open containers
+
+        Returns the number of matched containers, the rest of the line and the rest
+        of the line after the last matched block quote marker (markdown-it keeps list
+        item indentation in the line, and only strips it when collecting lines).
+        """
+        quoted = line
+        for depth, container in enumerate(self._containers):
+            if isinstance(container, _BlockQuote):
+                m = _blockquote_continuation_re.match(line)
+                if not m:
+                    return depth, line, quoted
+                line = quoted = line[m.end() :]
+            else:
+                if container.starts_blank:
+                    container.starts_blank = False
+                    if not line.strip():
+                        return depth, line, quoted
+                if not line.strip() or _indent(line) >= container.content_indent:
+                    line = line[container.content_indent :]
+                else:
+                    return depth, line, quoted
+        return len(self._containers), line, quoted
+
+    def _list_indent(self) -> int:
+        """The content indentation of the innermost list item, relative to the last block quote"""
+        indent = 0
+        for container in self._containers:
+            if isinstance(container, _BlockQuote):
+                indent = 0
+            else:
+                indent += container.content_indent
+        return indent
+
+    def _close_paragraph(self) -> None:
+        if self._paragraph is not None:
+            self._preceding_inline = "\n".join(self._paragraph).strip()
+            self._paragraph = None
+
+    def _close_containers(self, depth: int) -> None:
+        if depth < len(self._containers):
+            self._close_paragraph()
+            del self._containers[depth:]
+            self._preceding_inline = None
+
+    def _close_fence(self) -> Fence:
+        fence = self._fence
+        assert fence is not None
+        self._fence = None
+        self._preceding_inline = None
+        if fence.verbatim:
+            return Fence(
+                fence.info,
+                "",
+                fence.line,
+                fence.preceding_inline,
+                (fence.line + 1, fence.line + 1 + fence.line_count),
+            )
+        return Fence(
+            fence.info,
+            "".join(line + "\n" for line in fence.content),
+            fence.line,
+            fence.preceding_inline,
+        )
+
+    def _is_lazy_continuation(self, matched: int, rest: str, quoted: str) -> bool:
+        """If a line not matching all containers continues the open paragraph"""
+        if self._paragraph is None or not rest.strip():
+            return False
+        text = rest.lstrip(" \t")
+        outermost = self._containers[matched]
+        if isinstance(outermost, _BlockQuote):
+            # the outermost unmatched block quote sees the line's real indentation,
+            # any nested one only sees it as "outdented" and ignores it
+            if _indent(rest) < 4 and _interrupts(text):
+                return False
+            nested = self._containers[matched + 1 :]
+            return not (
+                any(isinstance(c, _BlockQuote) for c in nested) and _interrupts(text)
+            )
+        innermost = self._containers[-1]
+        if (
+            isinstance(innermost, _ListItem)
+            and _list_item_re.match(text)
+            and _indent(quoted) - (self._list_indent() - innermost.content_indent) >= 4
+        ):
+            # too far indented to be an item of the parent list, but not enough to be
+            # one of a nested list
+            return True
+        return not _interrupts(text)
+
+    def feed(self, line: str) -> typing.List[Fence]:
+        """Process the next line (without line ending) of the document"""
+        line_index = self.line_index
+        self.line_index += 1
+        closed: typing.List[Fence] = []
+
+        matched, rest, quoted = self._match_containers(line)
+
+        if self._fence is not None:
+            if matched >= self._fence_depth:
+                fence = self._fence
+                if fence.is_closed_by(rest):
+                    closed.append(self._close_fence())
+                    return closed
+                if fence.verbatim:
+                    fence.line_count += 1
+                    return closed
+                # strip up to the indentation of the opening fence
+                strip = min(fence.indent, _indent(rest))
+                fence.content.append(rest[strip:])
+                return closed
+            # the container holding the fence has ended, and with it the fence
+            closed.append(self._close_fence())
+
+        if self._html_end is not None:
+            # unlike fences, html blocks in list items also end at blank lines that
+            # aren't indented up to the list item's content
+            if matched >= self._html_depth and not (
+                not rest.strip() and _indent(quoted) < self._list_indent()
+            ):
+                if self._html_end.search(rest.lstrip(" \t")):
+                    self._html_end = None
+                return closed
+            # the container holding the html block has ended
+            self._html_end = None
+
+        # lazy paragraph continuation lines don't need to match all containers
+        if (
+            matched < len(self._containers)
+            and self._paragraph is not None
+            and self._is_lazy_continuation(matched, rest, quoted)
+        ):
+            self._paragraph.append(quoted[min(self._list_indent(), _indent(quoted)) :])
+            return closed
+
+        # new containers
+        while True:
+            if _indent(rest) >= 4 or not rest.strip():
+                break
+            bq = _blockquote_re.match(rest)
+            if bq:
+                self._close_containers(matched)
+                self._close_paragraph()
+                self._preceding_inline = None
+                self._containers.append(_BlockQuote())
+                matched += 1
+                rest = rest[bq.end() :]
+                continue
+            if _thematic_break_re.match(rest) or (
+                self._paragraph is not None
+                and matched == len(self._containers)
+                and _setext_underline_re.match(rest)
+            ):
+                break
+            li = _list_item_re.match(rest)
+            if li:
+                content = li.group(5)
+                if self._paragraph is not None and matched == len(self._containers):
+                    # restrictions on lists interrupting a paragraph
+                    if not content or (li.group(3) is not None and li.group(3) != "1"):
+                        break
+                marker_end = len(li.group(1)) + len(li.group(2))
+                spaces = len(li.group(4) or "")
+                if not content or spaces > 4:
+                    content_indent = marker_end + 1
+                else:
+                    content_indent = marker_end + spaces
+                self._close_containers(matched)
+                self._close_paragraph()
+                self._preceding_inline = None
+                self._containers.append(_ListItem(content_indent, not content))
+                matched += 1
+                rest = rest[content_indent:] if content else ""
+                continue
+            break
+
+        self._close_containers(matched)
+
+        # leaf blocks
+        if not rest.strip():
+            self._close_paragraph()
+            return closed
+
+        indent = _indent(rest)
+        if indent >= 4:
+            if self._paragraph is not None:
+                self._paragraph.append(rest)
+            else:
+                # indented code block
+                self._preceding_inline = None
+            return closed
+
+        fence_match = _match_fence_open(rest)
+        if fence_match:
+            self._close_paragraph()
+            marker = fence_match.group(2)
+            self._fence = _OpenFence(
+                marker[0],
+                len(marker),
+                indent,
+                fence_match.group(3),
+                line_index,
+                self._preceding_inline,
+                self.lazy and indent == 0 and not self._containers,
+            )
+            self._fence_depth = len(self._containers)
+            return closed
+
+        if self._paragraph is not None and _setext_underline_re.match(rest):
+            # setext heading - its inline content is the paragraph's
+            self._close_paragraph()
+            return closed
+
+        if _thematic_break_re.match(rest):
+            self._close_paragraph()
+            self._preceding_inline = None
+            return closed
+
+        heading = _atx_heading_re.match(rest)
+        if heading:
+            self._close_paragraph()
+            self._preceding_inline = (heading.group(2) or "").strip()
+            return closed
+
+        text = rest.lstrip(" \t")
+        if text.startswith("<"):
+            for start, end, can_interrupt in HTML_SEQUENCES:
+                if start.search(text):
+                    if self._paragraph is not None and not can_interrupt:
+                        break
+                    self._close_paragraph()
+                    self._preceding_inline = None
+                    if not end.search(text):
+                        self._html_end = end
+                        self._html_depth = len(self._containers)
+                    return closed
+
+        if self._paragraph is None:
+            self._paragraph = []
+            self._preceding_inline = None
+        self._paragraph.append(rest)
+        return closed
+
+    @property
+    def at_top_level(self) -> bool:
+        """If no block (other than headings etc. that are closed already) is open"""
+        return (
+            self._fence is None
+            and self._html_end is None
+            and self._paragraph is None
+            and not self._containers
+        )
+
+    def close(self) -> typing.List[Fence]:
+        """Signal the end of the document - returns a fence left unclosed, if any"""
+        if self._fence is not None:
+            return [self._close_fence()]
+        return []
+
+
+def scan_fences(markdown_string: str) -> typing.Generator[Fence, None, None]:
+    """Find all fenced code blocks in a markdown document"""
+    # the same normalization as markdown-it does
+    markdown_string = markdown_string.replace("\r\n", "\n").replace("\r", "\n")
+    markdown_string = markdown_string.replace("\0", "\ufffd")
+    if markdown_string.endswith("\n"):
+        markdown_string = markdown_string[:-1]
+
+    scanner = FenceScanner()
+    for line in markdown_string.split("\n"):
+        yield from scanner.feed(line)
+    yield from scanner.close()
+
+
+def can_scan_lazily(buffer: typing.Any) -> bool:
+    """If scan_fences_lazily can be used for a buffer of a utf8 encoded document
+
+    That's if the document needs none of the normalization scan_fences does, so its
+    fences' content is the same as the bytes of their lines.
+    """
+    return buffer.find(b"\r") == -1 and buffer.find(b"\0") == -1
+
+
+def scan_fences_lazily(buffer: typing.Any) -> typing.Generator[Fence, None, None]:
+    """Find all fenced code blocks in a utf8 encoded (e.g. memory mapped) document
+
+    Only one line of the document is decoded at a time. Fences that aren't nested in
+    any container are returned without content, with the span of its bytes in the
+    buffer instead. The buffer has to pass can_scan_lazily.
+    """
+    scanner = FenceScanner(lazy=True)
+    # offsets of the lines' first bytes, for translating the spans of fence lines
+    offsets = array.array("q")
+    size = len(buffer)
+
+    def with_byte_span(fence: Fence) -> Fence:
+        if fence.span is None:
+            return fence
+        start, end = fence.span
+        start, end = offsets[start], offsets[end]
+        if start < end == size and buffer[size - 1 : size] != b"\n":
+            # an unclosed fence at the end of a file without a final line break -
+            # its content ends with one regardless
+            return fence._replace(
+                content=buffer[start:end].decode("utf8") + "\n", span=None
+            )
+        return fence._replace(span=(start, end))
+
+    position = 0
+    while position < size:
+        end = buffer.find(b"\n", position)
+        if end == -1:
+            end = size
+        offsets.append(position)
+        for fence in scanner.feed(buffer[position:end].decode("utf8")):
+            yield with_byte_span(fence)
+        position = end + 1
+    offsets.append(size)
+    for fence in scanner.close():
+        yield with_byte_span(fence)
+
+
+def split_markdown(
+    lines: typing.Iterable[str], chunk_size: int
+) -> typing.Generator[MarkdownChunk, None, None]:
+    """Split a document, given as lines with line breaks, into separately parseable chunks
+
+    Chunks of (at least) chunk_size characters end at a blank line followed by an
+    unindented line, outside of any container, fence or html block. Blocks of
+    markdown-it plugins are expected to indent their content (like admonitions do),
+    and front matter to fit in the first chunk.
+    """
+    scanner = FenceScanner()
+    parts: typing.List[str] = []
+    size = 0
+    start = 0
+    preceding_inline = None
+    previous_blank = False
+    for line_index, line in enumerate(lines):
+        text = line.rstrip("\n")
+        if (
+            size >= chunk_size
+            and previous_blank
+            and text[:1] not in ("", " ", "\t")
+            and scanner.at_top_level
+        ):
+            yield MarkdownChunk(start, "".join(parts), preceding_inline)
+            parts = []
+            size = 0
+            start = line_index
+            preceding_inline = scanner._preceding_inline
+        parts.append(line)
+        size += len(line)
+        previous_blank = not text.strip(" \t")
+        scanner.feed(text)
+    if parts:
+        yield MarkdownChunk(start, "".join(parts), preceding_inline)
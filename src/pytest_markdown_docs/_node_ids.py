@@ -0,0 +1,52 @@
+import typing
+
+import pytest
+
+NODE_IDS_CACHE_KEY = "markdown-docs/node-ids"
+
+
+class NodeIdIndex:
+    """Maps node ids of code fence tests to their stable fence identities
+
+    Node ids contain line numbers, so they change whenever text above a fence is
+    edited. The index (kept in the pytest cache) is used for carrying the failures
+    recorded by --last-failed/--failed-first over to the new node ids.
+    """
+
+    def __init__(self, cache: pytest.Cache):
+        self.cache = cache
+        self.previous: typing.Dict[str, str] = cache.get(NODE_IDS_CACHE_KEY, {})
+        self.current: typing.Dict[str, str] = {}
+
+    def add(self, nodeid: str, fence_id: str) -> None:
+        self.current[nodeid] = fence_id
+
+    def update_lastfailed(
+        self, lastfailed: typing.Dict[str, bool], items: typing.Iterable[typing.Any]
+    ) -> None:
+        """Rename failures recorded under node ids that items don't have anymore"""
+        failed_fences = {
+            self.previous[nodeid]: nodeid
+            for nodeid in lastfailed
+            if nodeid in self.previous
+        }
+        for item in items:
+            fence_id = getattr(item, "fence_id", None)
+            if fence_id is None:
+                continue
+            old_nodeid = failed_fences.get(fence_id)
+            if old_nodeid is not None and old_nodeid != item.nodeid:
+                lastfailed.pop(old_nodeid, None)
+                lastfailed[item.nodeid] = True
+
+    def save(self) -> None:
+        if not self.current:
+            return
+        fence_ids = set(self.current.values())
+        data = {
+            nodeid: fence_id
+            for nodeid, fence_id in self.previous.items()
+            if fence_id not in fence_ids
+        }
+        data.update(self.current)
+        self.cache.set(NODE_IDS_CACHE_KEY, data)
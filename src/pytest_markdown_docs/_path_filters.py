@@ -0,0 +1,71 @@
+import fnmatch
+import os
+import pathlib
+import re
+import typing
+
+from _pytest.pathlib import bestrelpath
+
+
+class PathFilter:
+    """Include and exclude glob patterns for the files code fences are collected from
+
+    Patterns containing a "/" are matched against paths relative to the rootdir, other
+    patterns against the names of files and directories. A pattern matching a
+    directory matches everything in it. Without include patterns, all files not
+    excluded are included.
+    """
+
+    def __init__(
+        self,
+        rootpath: pathlib.Path,
+        include: typing.Sequence[str],
+        exclude: typing.Sequence[str],
+    ):
+        self.rootpath = rootpath
+        self.include = [pattern.rstrip("/") for pattern in include]
+        self.exclude = [pattern.rstrip("/") for pattern in exclude]
+
+    def _parts(self, path: pathlib.Path) -> typing.List[str]:
+        return bestrelpath(self.rootpath, path).replace(os.sep, "/").split("/")
+
+    @staticmethod
+    def _matches(parts: typing.List[str], patterns: typing.Sequence[str]) -> bool:
+        for pattern in patterns:
+            if "/" in pattern:
+                if any(
+                    fnmatch.fnmatch("/".join(parts[:end]), pattern)
+                    for end in range(1, len(parts) + 1)
+                ):
+                    return True
+            elif any(fnmatch.fnmatch(part, pattern) for part in parts):
+                return True
+        return False
+
+    def excludes(self, path: pathlib.Path) -> bool:
+        return bool(self.exclude) and self._matches(self._parts(path), self.exclude)
+
+    def includes(self, path: pathlib.Path) -> bool:
+        parts = self._parts(path)
+        if self.exclude and self._matches(parts, self.exclude):
+            return False
+        return not self.include or self._matches(parts, self.include)
+
+    def prunes(self, directory: pathlib.Path) -> bool:
+        """If no file within a directory can be included"""
+        parts = self._parts(directory)
+        if self.exclude and self._matches(parts, self.exclude):
+            return True
+        if not self.include or self._matches(parts, self.include):
+            return False
+        relative_directory = "/".join(parts) + "/"
+        for pattern in self.include:
+            if "/" not in pattern:
+                # could match the name of any file below
+                return False
+            literal_prefix = re.split(r"[*?[]", pattern, maxsplit=1)[0]
+            if literal_prefix.startswith(relative_directory) or (
+                relative_directory.startswith(literal_prefix)
+            ):
+                return False
+        return True
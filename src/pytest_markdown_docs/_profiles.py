@@ -0,0 +1,75 @@
+import os
+import pathlib
+import pstats
+import re
+import typing
+
+# functions as keyed by pstats: (file name, line number, function name)
+_Function = typing.Tuple[str, int, str]
+
+
+def profile_path(directory: pathlib.Path, fence_id: str) -> pathlib.Path:
+    """Where the profile of a code fence is written, named after its stable identity"""
+    return directory / (re.sub(r"[^\w.-]+", "_", fence_id).strip("_") + ".prof")
+
+
+class ProfileSummary:
+    """The hottest functions across the profiles of the code fences that ran
+
+    The code of a fence is compiled as a module, which profiles list at line 1 of its
+    markdown (or python) file. It's listed as `<code fence>` at the line of the fence
+    instead, so fences of the same file are told apart.
+    """
+
+    def __init__(self, rootpath: pathlib.Path):
+        self.rootpath = rootpath
+        self.profile_count = 0
+        # calls, total time (excluding sub calls) and cumulative time per function
+        self.totals: typing.Dict[_Function, typing.List[float]] = {}
+
+    def add(self, path: str, source_path: str, start_line: int) -> None:
+        try:
+            stats = pstats.Stats(path).stats  # type: ignore[attr-defined]
+        except (OSError, EOFError, TypeError, ValueError):
+            # e.g. removed since, or written by an incompatible python version
+            return
+        self.profile_count += 1
+        for function, (_, calls, tottime, cumtime, _) in stats.items():
+            filename, line, name = function
+            if (
+                "_lsprof.Profiler" in name
+                or os.path.basename(filename) == "cProfile.py"
+            ):
+                # stopping the profiler
+                continue
+            if name == "<module>" and filename == source_path:
+                # the line depends on the Python version (older ones report the line
+                # of the first statement of a module compiled from an AST)
+                function = (filename, start_line, "<code fence>")
+            totals = self.totals.setdefault(function, [0, 0.0, 0.0])
+            totals[0] += calls
+            totals[1] += tottime
+            totals[2] += cumtime
+
+    def _location(self, function: _Function) -> str:
+        filename, line, name = function
+        if filename == "~":
+            # built-in functions
+            return name
+        if os.path.isabs(filename):
+            try:
+                filename = pathlib.Path(filename).relative_to(self.rootpath).as_posix()
+            except ValueError:
+                pass
+        return f"{filename}:{line}({name})"
+
+    def summary(self, count: int) -> typing.List[str]:
+        """Lines listing the `count` functions with the most time spent in them"""
+        lines = [f"{'tottime':>9} {'cumtime':>9} {'calls':>9}  function"]
+        hottest = sorted(self.totals.items(), key=lambda item: item[1][1], reverse=True)
+        for function, (calls, tottime, cumtime) in hottest[:count]:
+            lines.append(
+                f"{tottime:8.3f}s {cumtime:8.3f}s {int(calls):9d}  "
+                f"{self._location(function)}"
+            )
+        return lines
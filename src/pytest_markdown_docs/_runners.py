@@ -1,19 +1,47 @@
 import abc
 import ast
+import asyncio
+import collections
+import cProfile
+import contextlib
+import hashlib
+import importlib.util
 import inspect
+import io
+import marshal
+import os
+import pathlib
+import pickle
+import queue
+import signal
+import sys
+import threading
+import time
 import traceback
+import types
 import typing
+import warnings
 from abc import abstractmethod
 
 import pytest
+from _pytest.outcomes import OutcomeException
 
-from pytest_markdown_docs.definitions import FenceTestDefinition
+from pytest_markdown_docs.definitions import FenceBlock, FenceTestDefinition
 
 _default_runner: typing.Optional["_Runner"] = None
 _registered_runners = {}
 
 
 class _Runner(metaclass=abc.ABCMeta):
+    # whether changes a fence makes to its globals are visible after runtest returns,
+    # which is required for running continuation chains incrementally
+    shares_namespace = True
+    # whether the runner can run independent fences concurrently, see
+    # DefaultRunner.runtest_concurrently and DefaultRunner.runtest_threaded
+    supports_concurrency = False
+    # whether runtest profiles the fence with the `profiler` it's passed
+    supports_profiling = False
+
     @abstractmethod
     def runtest(self, test: FenceTestDefinition, args: dict[str, typing.Any]): ...
 
@@ -26,12 +54,251 @@ class _Runner(metaclass=abc.ABCMeta):
     ): ...
 
 
+_CompileKey = typing.Tuple[str, str, int, int]
+
+
+def compile_blocks(
+    blocks: typing.Sequence[FenceBlock], filename: str, flags: int
+) -> types.CodeType:
+    """Compile the blocks of a continuation chain into a single code object
+
+    Line numbers are moved to the blocks' lines in the source file, so tracebacks
+    point into it.
+    """
+    module = ast.Module(body=[], type_ignores=[])
+    for block in blocks:
+        try:
+            tree = ast.parse(block.content, filename=filename)
+        except SyntaxError as e:
+            if e.lineno is not None:
+                e.lineno += block.start_line
+            # end_lineno is only set since python 3.10
+            end_lineno = getattr(e, "end_lineno", None)
+            if end_lineno is not None:
+                e.end_lineno = end_lineno + block.start_line
+            raise
+        ast.increment_lineno(tree, block.start_line)
+        module.body.extend(tree.body)
+    return compile(
+        module, filename=filename, mode="exec", flags=flags, dont_inherit=True
+    )
+
+
+class CompileCache:
+    """Compiled code objects for continuation chains of fences
+
+    Code objects are kept in memory for the duration of the session (up to `maxsize`
+    of them), keyed by a hash of the blocks, the filename and the compile flags.
+    If a directory is configured, they are also marshalled to disk - similar to
+    `__pycache__` - so subsequent sessions can skip compilation as well.
+    """
+
+    maxsize = 1024
+
+    def __init__(self) -> None:
+        self._code: collections.OrderedDict[_CompileKey, types.CodeType] = (
+            collections.OrderedDict()
+        )
+        # fences can be compiled from several threads, see DefaultRunner.runtest_threaded
+        self._lock = threading.Lock()
+        self.configure(None)
+
+    def configure(self, directory: typing.Optional[pathlib.Path]) -> None:
+        """Reset the cache and its statistics, e.g. for a new session"""
+        self.directory = directory
+        self._code.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def compile(
+        self, blocks: typing.Sequence[FenceBlock], filename: str, flags: int
+    ) -> types.CodeType:
+        with self._lock:
+            return self._compile(blocks, filename, flags)
+
+    def _compile(
+        self, blocks: typing.Sequence[FenceBlock], filename: str, flags: int
+    ) -> types.CodeType:
+        blocks_hash = hashlib.sha256()
+        for block in blocks:
+            blocks_hash.update(f"{block.start_line}\0".encode())
+            blocks_hash.update(block.digest.encode())
+            blocks_hash.update(b"\0")
+        # asserts are stripped when optimizing, so (like .opt-N.pyc files) code
+        # compiled at other optimization levels can't be reused
+        key = (blocks_hash.hexdigest(), filename, flags, sys.flags.optimize)
+        code = self._code.get(key)
+        if code is not None:
+            self.hits += 1
+            self._code.move_to_end(key)
+            return code
+
+        cache_file = None
+        if self.directory is not None:
+            key_hash = hashlib.sha256("\0".join(map(str, key)).encode("utf8"))
+            cache_file = self.directory / f"{key_hash.hexdigest()}.pyc"
+            code = self._load(cache_file)
+
+        if code is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            code = compile_blocks(blocks, filename, flags)
+            if cache_file is not None:
+                self._dump(cache_file, code)
+
+        self._code[key] = code
+        if len(self._code) > self.maxsize:
+            self._code.popitem(last=False)
+        return code
+
+    def _load(self, cache_file: pathlib.Path) -> typing.Optional[types.CodeType]:
+        try:
+            data = cache_file.read_bytes()
+        except OSError:
+            return None
+        magic = importlib.util.MAGIC_NUMBER
+        if not data.startswith(magic):
+            return None
+        try:
+            return marshal.loads(data[len(magic) :])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def _dump(self, cache_file: pathlib.Path, code: types.CodeType) -> None:
+        # write + rename, since other processes (e.g. xdist workers) may read concurrently
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        try:
+            tmp_file.write_bytes(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+
+
+compile_cache = CompileCache()
+
+
+# extra time async fences get for handling their cancellation after timing out,
+# before they are interrupted like synchronous code
+TIMEOUT_GRACE = 1.0
+
+
+class FenceTimeout(Exception):
+    """A code fence didn't finish within its timeout"""
+
+
+def _fence_location(
+    test: FenceTestDefinition, frames: typing.Iterable[types.FrameType]
+) -> str:
+    """Where a fence is stuck, given the frames of its stack (innermost last)"""
+    lineno = None
+    for frame in frames:
+        if frame.f_code.co_filename == str(test.source_path):
+            lineno = frame.f_lineno
+    if lineno is None:
+        return ""
+    return f" while at line {lineno} of {test.source_path}"
+
+
+def _outer_frames(
+    frame: typing.Optional[types.FrameType],
+) -> typing.List[types.FrameType]:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames[::-1]
+
+
+@contextlib.contextmanager
+def _alarm(test: FenceTestDefinition, seconds: float):
+    """Interrupt the code in the block with FenceTimeout after some seconds
+
+    Uses SIGALRM, so it only has an effect in the main thread on platforms that have
+    it (i.e. not Windows).
+    """
+    if not hasattr(signal, "setitimer") or (
+        threading.current_thread() is not threading.main_thread()
+    ):
+        warnings.warn(
+            "Timeouts can only interrupt synchronous code with SIGALRM, in the main thread",
+            pytest.PytestWarning,
+        )
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise FenceTimeout(
+            f"Code fence timed out after {test.timeout}s"
+            + _fence_location(test, _outer_frames(frame))
+        )
+
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    started = time.monotonic()
+    previous_delay, previous_interval = signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+        if previous_delay:
+            # restore another alarm, e.g. the one of pytest-timeout
+            remaining = previous_delay - (time.monotonic() - started)
+            signal.setitimer(
+                signal.ITIMER_REAL, max(remaining, 1e-6), previous_interval
+            )
+
+
+async def _wait_with_timeout(
+    test: FenceTestDefinition, coro: typing.Coroutine, timeout: float
+):
+    task = asyncio.ensure_future(coro)
+    done, _ = await asyncio.wait({task}, timeout=timeout)
+    if task in done:
+        return task.result()
+    location = _fence_location(test, task.get_stack())
+    task.cancel()
+    await asyncio.wait({task})
+    raise FenceTimeout(f"Code fence timed out after {timeout}s{location}")
+
+
+class FenceOutcome(typing.NamedTuple):
+    """The outcome of a fence run together with other ones"""
+
+    # the exception the fence failed (or was skipped) with, None if it passed
+    exception: typing.Optional[BaseException]
+    stdout: str = ""
+    stderr: str = ""
+
+
+class _ThreadOutput:
+    """A stream writing to a buffer of the current thread, if it has one"""
+
+    def __init__(self, default: typing.TextIO):
+        self.default = default
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer or self.default).write(text)
+
+    def flush(self) -> None:
+        if getattr(self.local, "buffer", None) is None:
+            self.default.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.default, name)
+
+
 RUNNER_TYPE = typing.TypeVar("RUNNER_TYPE", bound=type[_Runner])
 
 
-def register_runner(*, default: bool = False):
+def register_runner(*, default: bool = False, name: typing.Optional[str] = None):
     """Decorator for adding custom runners
 
+    Runners are registered under their class name, unless a name is given.
+
     e.g.
     @register_runner()
     def my_runner(src):
@@ -41,7 +308,7 @@ def register_runner(*, default: bool = False):
     def decorator(r: RUNNER_TYPE) -> RUNNER_TYPE:
         global _default_runner
         runner = r()
-        _registered_runners[r.__name__] = runner
+        _registered_runners[name or r.__name__] = runner
         if default:
             _default_runner = runner
         return r
@@ -51,29 +318,200 @@ def register_runner(*, default: bool = False):
 
 @register_runner(default=True)
 class DefaultRunner(_Runner):
-    def runtest(self, test: FenceTestDefinition, args, *, asyncio_runner=None):
-        try:
-            compiled = compile(
-                test.source,
-                filename=test.source_path,
-                mode="exec",
-                flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
-                dont_inherit=True,
+    supports_concurrency = True
+    supports_profiling = True
+
+    def compile(self, test: FenceTestDefinition) -> types.CodeType:
+        return compile_cache.compile(
+            test.chain,
+            filename=str(test.source_path),
+            flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+        )
+
+    def is_async(self, test: FenceTestDefinition) -> bool:
+        """If the fence has top-level await (etc.), i.e. runs as a coroutine"""
+        return bool(self.compile(test).co_flags & inspect.CO_COROUTINE)
+
+    def runtest(
+        self,
+        test: FenceTestDefinition,
+        args,
+        *,
+        asyncio_runner=None,
+        profiler: typing.Optional[cProfile.Profile] = None,
+    ):
+        compiled = self.compile(test)
+
+        is_async = bool(compiled.co_flags & inspect.CO_COROUTINE)
+        if is_async and asyncio_runner is None:
+            raise RuntimeError(
+                "Top-level async code in markdown code blocks is not natively supported.\n"
+                "You need pytest-asyncio>=1.1.0 to run async code blocks:\n"
+                "  pip install 'pytest-asyncio>=1.1.0'"
             )
-        except SyntaxError:
-            raise
 
-        if compiled.co_flags & inspect.CO_COROUTINE:
-            if asyncio_runner is None:
-                raise RuntimeError(
-                    "Top-level async code in markdown code blocks is not natively supported.\n"
-                    "You need pytest-asyncio>=1.1.0 to run async code blocks:\n"
-                    "  pip install 'pytest-asyncio>=1.1.0'"
-                )
-            coro = eval(compiled, args)
-            asyncio_runner.run(coro)
+        timeout = test.timeout
+        if timeout is None:
+            alarm: typing.ContextManager[None] = contextlib.nullcontext()
         else:
-            exec(compiled, args)
+            # async fences are cancelled at the timeout, the alarm only interrupts
+            # ones blocking the event loop (or not handling their cancellation)
+            alarm = _alarm(test, timeout + TIMEOUT_GRACE if is_async else timeout)
+
+        # only the fence's own code is profiled
+        profiling = profiler if profiler is not None else contextlib.nullcontext()
+        with alarm, profiling:
+            if is_async:
+                coro = eval(compiled, args)
+                if timeout is not None:
+                    coro = _wait_with_timeout(test, coro, timeout)
+                asyncio_runner.run(coro)
+            else:
+                exec(compiled, args)
+
+    def runtest_concurrently(
+        self,
+        tests: typing.Sequence[
+            typing.Tuple[FenceTestDefinition, typing.Dict[str, typing.Any]]
+        ],
+        *,
+        asyncio_runner,
+    ) -> typing.List[FenceOutcome]:
+        """Run independent async fences concurrently, on the same event loop
+
+        Each fence gets its own globals, timeout and retries.
+        """
+
+        async def run_one(test: FenceTestDefinition, args):
+            for attempt in range(test.max_retries + 1):
+                try:
+                    coro = eval(self.compile(test), args)
+                    if test.timeout is not None:
+                        coro = _wait_with_timeout(test, coro, test.timeout)
+                    await coro
+                    return FenceOutcome(None)
+                except Exception as e:
+                    if attempt == test.max_retries:
+                        return FenceOutcome(e)
+                except OutcomeException as e:
+                    return FenceOutcome(e)
+
+        async def run_all():
+            return await asyncio.gather(*(run_one(test, args) for test, args in tests))
+
+        # total time each fence may take, including its retries
+        limits = [
+            (test.timeout * (test.max_retries + 1), test)
+            for test, _ in tests
+            if test.timeout is not None
+        ]
+        if len(limits) < len(tests):
+            alarm: typing.ContextManager[None] = contextlib.nullcontext()
+        else:
+            # interrupts a fence blocking the event loop (and with it all the others)
+            # once the slowest one should have finished
+            limit, longest = max(limits, key=lambda limit: limit[0])
+            alarm = _alarm(longest, limit + TIMEOUT_GRACE)
+        with alarm:
+            return asyncio_runner.run(run_all())
+
+    def runtest_threaded(
+        self,
+        tests: typing.Sequence[
+            typing.Tuple[FenceTestDefinition, typing.Dict[str, typing.Any]]
+        ],
+        *,
+        max_workers: int,
+    ) -> typing.List[FenceOutcome]:
+        """Run independent fences on a pool of threads
+
+        Each fence gets its own globals and retries, and its output is captured
+        separately. Async fences run on an event loop of their own. Threads can't be
+        interrupted, so fences that time out are reported as failed but are left
+        running in their (daemon) thread, and a new thread takes over the fences
+        still pending.
+        """
+        outcomes: typing.List[typing.Optional[FenceOutcome]] = [None] * len(tests)
+        started: typing.List[typing.Optional[float]] = [None] * len(tests)
+        thread_ids: typing.List[typing.Optional[int]] = [None] * len(tests)
+        finished = [threading.Event() for _ in tests]
+        lock = threading.Lock()
+        pending: "queue.SimpleQueue[int]" = queue.SimpleQueue()
+        for i in range(len(tests)):
+            pending.put(i)
+
+        def work() -> None:
+            while True:
+                try:
+                    i = pending.get_nowait()
+                except queue.Empty:
+                    return
+                thread_ids[i] = threading.get_ident()
+                started[i] = time.monotonic()
+                outcome = self._run_in_thread(*tests[i], outputs)
+                with lock:
+                    if outcomes[i] is None:
+                        outcomes[i] = outcome
+                finished[i].set()
+
+        def start_worker() -> None:
+            threading.Thread(target=work, name="markdown-docs", daemon=True).start()
+
+        stdout, stderr = sys.stdout, sys.stderr
+        outputs = (_ThreadOutput(stdout), _ThreadOutput(stderr))
+        sys.stdout, sys.stderr = outputs
+        try:
+            for _ in range(min(max_workers, len(tests))):
+                start_worker()
+            for i, (test, _) in enumerate(tests):
+                while not finished[i].wait(0.01):
+                    started_at, thread_id = started[i], thread_ids[i]
+                    if test.timeout is None or started_at is None or thread_id is None:
+                        continue
+                    if time.monotonic() - started_at < test.timeout:
+                        continue
+                    frame = sys._current_frames().get(thread_id)
+                    message = f"Code fence timed out after {test.timeout}s" + (
+                        _fence_location(test, _outer_frames(frame))
+                    )
+                    with lock:
+                        if outcomes[i] is None:
+                            outcomes[i] = FenceOutcome(FenceTimeout(message))
+                    start_worker()
+                    break
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+        return typing.cast(typing.List[FenceOutcome], outcomes)
+
+    def _run_in_thread(
+        self,
+        test: FenceTestDefinition,
+        args,
+        outputs: typing.Tuple[_ThreadOutput, _ThreadOutput],
+    ) -> FenceOutcome:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        outputs[0].local.buffer = stdout
+        outputs[1].local.buffer = stderr
+        exception: typing.Optional[BaseException] = None
+        try:
+            for attempt in range(test.max_retries + 1):
+                try:
+                    compiled = self.compile(test)
+                    if compiled.co_flags & inspect.CO_COROUTINE:
+                        asyncio.run(eval(compiled, args))
+                    else:
+                        exec(compiled, args)
+                    exception = None
+                    break
+                except Exception as e:
+                    exception = e
+                except OutcomeException as e:
+                    exception = e
+                    break
+        finally:
+            outputs[0].local.buffer = None
+            outputs[1].local.buffer = None
+        return FenceOutcome(exception, stdout.getvalue(), stderr.getvalue())
 
     def repr_failure(
         self,
@@ -86,7 +524,7 @@ class DefaultRunner(_Runner):
         Also displays a line-numbered excerpt of the code fence that ran.
         """
 
-        rawlines = test.source.rstrip("\n").split("\n")
+        rawlines = test.block_content.rstrip("\n").split("\n")
 
         # custom formatted traceback to translate line numbers and markdown files
         traceback_lines = []
@@ -109,12 +547,12 @@ class DefaultRunner(_Runner):
                 )
                 traceback_lines.append(f"    {line.lstrip()}")
 
-        maxdigits = len(str(len(rawlines)))
+        maxdigits = len(str(start_line + len(rawlines)))
         code_margin = "   "
         numbered_code = "\n".join(
             [
                 f"{i:>{maxdigits}}{code_margin}{line}"
-                for i, line in enumerate(rawlines[start_line:], start_line + 1)
+                for i, line in enumerate(rawlines, start_line + 1)
             ]
         )
 
@@ -131,6 +569,102 @@ class DefaultRunner(_Runner):
 """
 
 
+class IsolatedFenceFailure(Exception):
+    """A code fence failed in an isolated process, with the failure formatted there"""
+
+    def __init__(self, report: str):
+        super().__init__(report)
+        self.report = report
+
+
+@register_runner(name="isolated")
+class IsolatedRunner(DefaultRunner):
+    """Runs each code fence in a child process forked from the pytest process
+
+    The child starts out with everything the pytest process has imported already
+    (see --markdown-docs-preload), so isolation costs a fork rather than a fresh
+    interpreter, and any global state a fence changes is gone once it has run.
+    """
+
+    shares_namespace = False
+    supports_concurrency = False
+    # the fence runs in a child process, whose profile would be lost
+    supports_profiling = False
+
+    def runtest(
+        self,
+        test: FenceTestDefinition,
+        args,
+        *,
+        asyncio_runner=None,
+        profiler: typing.Optional[cProfile.Profile] = None,
+    ):
+        # the profiler is ignored (and not passed by the plugin), see supports_profiling
+        if not hasattr(os, "fork"):
+            raise RuntimeError(
+                "The isolated runner requires os.fork, which isn't available on this platform"
+            )
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._run_child(test, args, write_fd)
+        os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as pipe:
+            data = pipe.read()
+        _, status = os.waitpid(pid, 0)
+
+        if not data:
+            if os.WIFSIGNALED(status):
+                reason = f"was killed by signal {os.WTERMSIG(status)}"
+            else:
+                reason = f"exited with status {os.waitstatus_to_exitcode(status)}"
+            raise IsolatedFenceFailure(f"The code fence's process {reason}")
+        outcome, message = pickle.loads(data)
+        if outcome == "skipped":
+            pytest.skip(message)
+        elif outcome == "xfailed":
+            pytest.xfail(message)
+        elif outcome == "failed":
+            raise IsolatedFenceFailure(message)
+
+    def _run_child(
+        self, test: FenceTestDefinition, args, write_fd: int
+    ) -> typing.NoReturn:
+        result: typing.Tuple[str, str]
+        try:
+            try:
+                # the parent's event loop can't be used from a forked process
+                super().runtest(
+                    test, args, asyncio_runner=types.SimpleNamespace(run=asyncio.run)
+                )
+                result = ("passed", "")
+            except pytest.skip.Exception as e:
+                result = ("skipped", e.msg or "")
+            except pytest.xfail.Exception as e:
+                result = ("xfailed", e.msg or "")
+            except BaseException:
+                excinfo = pytest.ExceptionInfo.from_current()
+                result = ("failed", super().repr_failure(test, excinfo))
+            sys.stdout.flush()
+            sys.stderr.flush()
+            with os.fdopen(write_fd, "wb") as pipe:
+                pickle.dump(result, pipe)
+        finally:
+            # skip any cleanup (atexit handlers, fixture finalizers etc.) of the parent
+            os._exit(0)
+
+    def repr_failure(
+        self,
+        test: FenceTestDefinition,
+        excinfo: pytest.ExceptionInfo[BaseException],
+        style=None,
+    ):
+        if isinstance(excinfo.value, IsolatedFenceFailure):
+            return excinfo.value.report
+        return super().repr_failure(test, excinfo, style)
+
+
 def get_runner(name: typing.Optional[str]) -> _Runner:
     if name is None:
         assert _default_runner is not None
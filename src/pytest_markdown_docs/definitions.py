@@ -1,20 +1,113 @@
+import hashlib
 import pathlib
+import sys
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
+# definitions are kept for every collected fence, so keep them small where possible
+_slots: typing.Dict[str, typing.Any] = (
+    {"slots": True} if sys.version_info >= (3, 10) else {}
+)
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, **_slots)
+class FileSlice:
+    """A range of bytes of a file"""
+
+    path: pathlib.Path
+    offset: int
+    length: int
+
+    def read(self) -> str:
+        with self.path.open("rb") as f:
+            f.seek(self.offset)
+            return f.read(self.length).decode("utf8")
+
+
+@dataclass(frozen=True, **_slots)
+class FenceBlock:
+    # None for blocks read lazily from their file_slice
+    text: typing.Optional[str]
+    # line index (0-based) of the first line of the content in the source file
+    start_line: int
+    file_slice: typing.Optional[FileSlice] = None
+    # sha256 of the content, if known already
+    text_digest: typing.Optional[str] = None
+
+    @property
+    def content(self) -> str:
+        if self.text is not None:
+            return self.text
+        assert self.file_slice is not None
+        return self.file_slice.read()
+
+    @property
+    def digest(self) -> str:
+        if self.text_digest is not None:
+            return self.text_digest
+        return hashlib.sha256(self.content.encode("utf8")).hexdigest()
+
+
+@dataclass(frozen=True, **_slots)
 class FenceTestDefinition:
-    source: str
+    # the python blocks of the file (or docstring) the fence is in, shared by all of
+    # its fences, so the blocks of continuation chains aren't copied for every fence
+    blocks: typing.Sequence[FenceBlock] = field(hash=False, repr=False)
+    # index of the fence's block, and of the first block of its continuation chain
+    block_index: int
+    chain_start: int
     fixture_names: typing.Sequence[str]
-    start_line: int
     source_path: pathlib.Path
     runner_name: typing.Optional[str]
     max_retries: int = 0
+    # seconds after which the fence is interrupted, if any
+    timeout: typing.Optional[float] = None
+    # async fences that can run concurrently with other ones in the same file
+    concurrent: bool = False
+    # fences that can run in a thread, in parallel with other ones in the same file
+    parallel_safe: bool = False
+
+    @property
+    def block_content(self) -> str:
+        return self.blocks[self.block_index].content
+
+    @property
+    def block_digest(self) -> str:
+        """sha256 of the fence's content, without reading blocks read lazily"""
+        return self.blocks[self.block_index].digest
+
+    @property
+    def start_line(self) -> int:
+        return self.blocks[self.block_index].start_line
+
+    @property
+    def continuation(self) -> bool:
+        return self.chain_start < self.block_index
+
+    @property
+    def chain(self) -> typing.Sequence[FenceBlock]:
+        """The blocks that run for this fence: its continuation chain, ending with it"""
+        return self.blocks[self.chain_start : self.block_index + 1]
+
+    @property
+    def source(self) -> str:
+        """The code of the chain, padded with blank lines to match the source file lines
+
+        Built on demand - runners compile the chain's blocks directly instead.
+        """
+        parts = []
+        line_count = 0
+        for block in self.chain:
+            padding = max(block.start_line - line_count, 0)
+            parts.append("\n" * padding + block.content)
+            line_count += padding + block.content.count("\n")
+        return "".join(parts)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **_slots)
 class ObjectTestDefinition:
     intra_object_index: int
     object_name: str
     fence_test: FenceTestDefinition
+    # hash of the docstring the fence is in
+    docstring_digest: str = ""
@@ -1,15 +1,99 @@
+import pathlib
+
 import pytest
 import typing
 
 if typing.TYPE_CHECKING:
     from markdown_it import MarkdownIt
 
+    from pytest_markdown_docs.definitions import FenceTestDefinition
+    from pytest_markdown_docs.plugin import MarkdownInlinePythonItem
+
 
 def pytest_markdown_docs_globals() -> typing.Dict[str, typing.Any]:
     return {}
 
 
+def pytest_markdown_docs_session_globals() -> typing.Dict[str, typing.Any]:
+    """Globals for all code fences, only evaluated once per session"""
+    return {}
+
+
+def pytest_markdown_docs_file_globals(
+    path: pathlib.Path,
+) -> typing.Dict[str, typing.Any]:
+    """Globals for the code fences of a markdown file or python module, evaluated once per file"""
+    return {}
+
+
 @pytest.hookspec(firstresult=True)
 def pytest_markdown_docs_markdown_it() -> "MarkdownIt":
     """Configure a custom markdown_it.MarkdownIt parser."""
     return MarkdownIt()
+
+
+# Lifecycle hooks around the hot paths of the plugin: parsing files, compiling fences
+# and running them. Timestamps are `time.perf_counter()` values (a monotonic clock),
+# durations are in seconds. The plugin only takes timings and calls these hooks if a
+# plugin implements one of the hooks of a phase, so they cost nothing otherwise.
+
+
+def pytest_markdown_docs_before_parse(path: pathlib.Path, start: float) -> None:
+    """Called before the code fences of a markdown file or python module are extracted"""
+
+
+def pytest_markdown_docs_after_parse(
+    path: pathlib.Path,
+    fences: typing.Sequence["FenceTestDefinition"],
+    start: float,
+    duration: float,
+    exception: typing.Optional[BaseException],
+) -> None:
+    """Called after the code fences of a file were extracted (or extracting them failed)
+
+    Parsing includes loading the fences from the collection cache, if enabled, but not
+    importing python modules whose docstrings are collected.
+    """
+
+
+def pytest_markdown_docs_before_compile(
+    item: "MarkdownInlinePythonItem", start: float
+) -> None:
+    """Called before the code of a fence (and its continuation chain) is compiled
+
+    Only called for fences run by the default runner, once per test - retries reuse
+    the compiled code. Fences run concurrently or in parallel aren't compiled apart.
+    """
+
+
+def pytest_markdown_docs_after_compile(
+    item: "MarkdownInlinePythonItem",
+    start: float,
+    duration: float,
+    exception: typing.Optional[BaseException],
+) -> None:
+    """Called after the code of a fence was compiled, or raised a SyntaxError
+
+    Compiled code is cached, so the duration of cache hits is that of the lookup.
+    """
+
+
+def pytest_markdown_docs_before_exec(
+    item: "MarkdownInlinePythonItem", attempt: int, start: float
+) -> None:
+    """Called before each attempt at running a fence: 0 for the first, 1 for the first
+    retry and so on
+
+    Fences run concurrently or in parallel with other ones aren't timed one by one, and
+    don't trigger the exec hooks.
+    """
+
+
+def pytest_markdown_docs_after_exec(
+    item: "MarkdownInlinePythonItem",
+    attempt: int,
+    start: float,
+    duration: float,
+    exception: typing.Optional[BaseException],
+) -> None:
+    """Called after each attempt at running a fence, with the exception it raised if any"""
@@ -1,4 +1,18 @@
+import ast
+import collections
+import cProfile
+import concurrent.futures
+import dataclasses
+import fnmatch
+import functools
+import importlib
+import hashlib
 import inspect
+import mmap
+import multiprocessing
+import os
+import sys
+import time
 import types
 import pathlib
 
@@ -8,12 +22,53 @@ from enum import Enum
 
 from _pytest._code import ExceptionInfo
 from _pytest.config.argparsing import Parser
-from _pytest.pathlib import import_path
+from _pytest.pathlib import (
+    bestrelpath,
+    import_path,
+    module_name_from_path as importlib_module_name,
+    resolve_package_path,
+)
 import logging
 
 from pytest_markdown_docs import hooks
-from pytest_markdown_docs.definitions import FenceTestDefinition, ObjectTestDefinition
-from pytest_markdown_docs._runners import get_runner
+from pytest_markdown_docs.definitions import (
+    FenceBlock,
+    FenceTestDefinition,
+    FileSlice,
+    ObjectTestDefinition,
+)
+from pytest_markdown_docs._runners import (
+    DefaultRunner,
+    _Runner,
+    FenceOutcome,
+    compile_cache,
+    get_runner,
+)
+from pytest_markdown_docs._fence_scanner import (
+    Fence,
+    can_scan_lazily,
+    scan_fences,
+    scan_fences_lazily,
+    split_markdown,
+)
+from pytest_markdown_docs._durations import DurationHistory
+from pytest_markdown_docs._node_ids import NodeIdIndex
+from pytest_markdown_docs._path_filters import PathFilter
+from pytest_markdown_docs._profiles import ProfileSummary, profile_path
+from pytest_markdown_docs._changes import (
+    ChangeManifest,
+    GitChanges,
+    content_digest,
+    fence_signature,
+    fence_signatures,
+)
+from pytest_markdown_docs._collection_cache import (
+    fence_tests_from_json,
+    fence_tests_to_json,
+    get_collection_cache,
+    object_tests_from_json,
+    object_tests_to_json,
+)
 
 if pytest.version_tuple >= (8, 0, 0):
     from _pytest.fixtures import TopRequest
@@ -30,26 +85,286 @@ logger = logging.getLogger("pytest-markdown-docs")
 
 MARKER_NAME = "markdown-docs"
 
+T = typing.TypeVar("T")
+
+_markdown_it_parser_key = pytest.StashKey[
+    typing.Tuple[typing.Tuple[object, ...], "MarkdownIt"]
+]()
+# fence tests of markdown files parsed ahead of collection, and the parser used
+_preparsed_key = pytest.StashKey[
+    typing.Tuple[
+        "MarkdownIt", typing.Dict[pathlib.Path, typing.List[FenceTestDefinition]]
+    ]
+]()
+
+_durations_key = pytest.StashKey[DurationHistory]()
+_manifest_key = pytest.StashKey[ChangeManifest]()
+_node_ids_key = pytest.StashKey[NodeIdIndex]()
+_session_globals_key = pytest.StashKey[typing.Dict[str, typing.Any]]()
+_base_globals_key = pytest.StashKey[typing.Optional[typing.Dict[str, typing.Any]]]()
+# include/exclude patterns for markdown files and for python modules' docstrings
+_markdown_filter_key = pytest.StashKey[PathFilter]()
+_docstring_filter_key = pytest.StashKey[PathFilter]()
+# the profile written for a code fence: its path, and the fence's source path and line
+_profile_key = pytest.StashKey[typing.Dict[str, typing.Any]]()
+# outcomes of the fences of a file that ran together, by node id
+_batch_outcomes_key = pytest.StashKey[typing.Dict[str, FenceOutcome]]()
+
+MARKDOWN_SUFFIXES = (".md", ".mdx", ".svx")
+# markdown files at least this large are scanned from a memory map, with the content of
+# their fences only read when needed (fast parser), or tokenized a chunk at a time
+LARGE_FILE_MIN_SIZE = 1024 * 1024
+# the minimum size of the chunks large files are tokenized in
+STREAMING_CHUNK_SIZE = 64 * 1024
+# prefix of the names of the xdist groups assigned to code fences
+XDIST_GROUP_PREFIX = "markdown-docs:"
+
 
 class FenceSyntax(Enum):
     default = "default"
     superfences = "superfences"
 
 
-def get_docstring_start_line(obj) -> typing.Optional[int]:
-    # Get the source lines and the starting line number of the object
-    try:
-        source_lines, start_line = inspect.getsourcelines(obj)
-    except OSError:
-        return None
+class ContinuationMode(Enum):
+    rerun = "rerun"
+    incremental = "incremental"
+
+
+class FenceParser(Enum):
+    markdown_it = "markdown-it"
+    fast = "fast"
+
+
+class XdistGroup(Enum):
+    none = "none"
+    chain = "chain"
+    file = "file"
+
+
+class DocstringCollection(Enum):
+    import_ = "import"
+    ast = "ast"
+
+
+class BatchMode(Enum):
+    # async fences, gathered on the event loop
+    concurrent = "concurrent"
+    # fences run on a pool of threads
+    threaded = "parallel-safe"
+
+
+class FenceIds(Enum):
+    line = "line"
+    content = "content"
+
+
+def module_name_from_path(path: pathlib.Path) -> str:
+    # Same module name as import_path would give the module in "prepend" mode
+    pkg_path = resolve_package_path(path)
+    if pkg_path is None:
+        return path.stem
+    names = list(path.with_suffix("").relative_to(pkg_path.parent).parts)
+    if names[-1] == "__init__":
+        names.pop()
+    return ".".join(names)
+
+
+def may_contain_fences(source: bytes) -> bool:
+    """If a python file's source has any fence markers - and so possibly fences in docstrings"""
+    return b"```" in source or b"~~~" in source
+
+
+def find_imported_module(
+    path: pathlib.Path, rootpath: pathlib.Path
+) -> typing.Optional[types.ModuleType]:
+    """The module imported from a file already, e.g. by pytest's own Module collector
+
+    Looks for the module under the names pytest's prepend/append and importlib import
+    modes give it.
+    """
+    for module_name in (
+        module_name_from_path(path),
+        importlib_module_name(path, rootpath),
+    ):
+        module = sys.modules.get(module_name)
+        module_file = getattr(module, "__file__", None)
+        try:
+            if module_file and os.path.samefile(module_file, path):
+                return module
+        except OSError:
+            pass
+    return None
+
+
+def find_docstrings_static(
+    source: typing.Union[str, bytes], module_name: str
+) -> typing.Generator[typing.Tuple[str, str, int], None, None]:
+    """Find module, class and function docstrings in source code without importing it
+
+    Yields (qualified name, cleaned docstring, line offset) tuples in source order,
+    where the line offset is relative to the cleaned docstring in the same way as
+    the offsets passed to `extract_fence_tests`.
+    """
+
+    def docstring_of(node, name):
+        docstr = ast.get_docstring(node)
+        if not docstr:
+            return None
+        doc_node = node.body[0].value
+        # inspect.cleandoc drops leading blank lines, so the cleaned docstring
+        # starts that many lines into the string literal
+        raw_lines = doc_node.value.split("\n")
+        skipped = next(
+            (i for i, line in enumerate(raw_lines) if line.strip()), len(raw_lines)
+        )
+        return name, docstr, doc_node.lineno + skipped - 1
+
+    def walk(node, qualname_prefix):
+        for child in node.body:
+            if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = qualname_prefix + child.name
+                found = docstring_of(child, qualname)
+                if found:
+                    yield found
+                if isinstance(child, ast.ClassDef):
+                    yield from walk(child, qualname + ".")
+
+    tree = ast.parse(source)
+    found = docstring_of(tree, module_name)
+    if found:
+        yield found
+    yield from walk(tree, "")
+
+
+def find_docstrings_in_module(
+    module: types.ModuleType, source: typing.Union[str, bytes]
+) -> typing.Generator[typing.Tuple[str, str, int], None, None]:
+    """Find the docstrings of an imported module and of its classes and functions
+
+    Like find_docstrings_static, but for the objects the module has at runtime (e.g.
+    decorated functions). Members are looked up in the __dict__ of the module and its
+    classes, the way inspect.getattr_static does, so no attributes (properties, lazy
+    module attributes etc.) are evaluated. Line offsets are looked up in an index of
+    the docstrings of the module's source. Docstrings shared by several objects (e.g.
+    of wrapped functions) are only yielded once.
+    """
+    module_name = module.__name__
+    offsets_by_name: typing.Dict[str, typing.Tuple[str, int]] = {}
+    offsets_by_docstring: typing.Dict[str, int] = {}
+    for name, docstr, offset in find_docstrings_static(source, module_name):
+        offsets_by_name[name] = (docstr, offset)
+        offsets_by_docstring.setdefault(docstr, offset)
+
+    visited: typing.Set[int] = set()
+    seen_offsets: typing.Set[int] = set()
+
+    def static_dict(obj) -> typing.Dict[str, typing.Any]:
+        try:
+            return vars(obj)
+        except TypeError:
+            return {}
+
+    def defined_in_module(member) -> bool:
+        if inspect.isclass(member):
+            return static_dict(member).get("__module__") == module_name
+        return inspect.isfunction(member) and member.__module__ == module_name
+
+    def walk(obj) -> typing.Generator[typing.Tuple[str, str, int], None, None]:
+        if id(obj) in visited:
+            return
+        visited.add(id(obj))
+
+        for _, member in sorted(static_dict(obj).items(), key=lambda item: item[0]):
+            if isinstance(member, (staticmethod, classmethod)):
+                member = member.__func__
+            if defined_in_module(member):
+                yield from walk(member)
+
+        # only the object's own docstring - inherited ones are found at their class
+        doc = (
+            obj.__doc__ if inspect.isfunction(obj) else static_dict(obj).get("__doc__")
+        )
+        if not isinstance(doc, str):
+            return
+        docstr = inspect.cleandoc(doc)
+        if not docstr:
+            return
+        obj_name = (
+            getattr(obj, "__qualname__", None)
+            or getattr(obj, "__name__", None)
+            or "<Unnamed obj>"
+        )
+        indexed = offsets_by_name.get(obj_name)
+        if indexed is not None and indexed[0] == docstr:
+            offset: typing.Optional[int] = indexed[1]
+        else:
+            offset = offsets_by_docstring.get(docstr)
+        if offset is None:
+            logger.warning(f"Could not find line number offset for docstring: {docstr}")
+        elif offset not in seen_offsets:
+            seen_offsets.add(offset)
+            yield obj_name, docstr, offset
+
+    yield from walk(module)
 
-    # Find the line in the source code that starts with triple quotes (""" or ''')
-    for idx, line in enumerate(source_lines):
-        line = line.strip()
-        if line.startswith(('"""', "'''")):
-            return start_line + idx  # Return the starting line number
 
-    return None  # Docstring not found in source
+def get_markdown_it_parser(config: pytest.Config) -> "MarkdownIt":
+    """The session's markdown parser, as configured by the pytest_markdown_docs_markdown_it hook
+
+    The parser is only created once per session, unless a plugin implementing the
+    hook (e.g. a conftest.py in a sub directory) has been registered since.
+    """
+    hook = config.hook.pytest_markdown_docs_markdown_it
+    implementations = tuple(impl.plugin for impl in hook.get_hookimpls())
+    cached = config.stash.get(_markdown_it_parser_key, None)
+    if cached is None or cached[0] != implementations:
+        cached = (implementations, hook())
+        config.stash[_markdown_it_parser_key] = cached
+    return cached[1]
+
+
+def get_base_globals(
+    node: pytest.Collector,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """Globals from the session and file scoped globals hooks, for the fences of a file
+
+    The hooks are only evaluated once (per session and per file, respectively), and
+    the merged globals copied into the namespace of each fence of the file. Returns
+    None if the hooks don't return any globals.
+    """
+    if _base_globals_key not in node.stash:
+        config = node.config
+        if _session_globals_key not in config.stash:
+            session_globals: typing.Dict[str, typing.Any] = {}
+            for global_set in config.hook.pytest_markdown_docs_session_globals():
+                session_globals.update(global_set)
+            config.stash[_session_globals_key] = session_globals
+        file_globals = config.stash[_session_globals_key].copy()
+        for global_set in node.ihook.pytest_markdown_docs_file_globals(path=node.path):
+            file_globals.update(global_set)
+        node.stash[_base_globals_key] = file_globals or None
+    return node.stash[_base_globals_key]
+
+
+def _default_thread_count() -> int:
+    # the same as for concurrent.futures.ThreadPoolExecutor
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+@functools.lru_cache(maxsize=None)
+def _runtest_keywords(runner: _Runner) -> typing.Optional[typing.FrozenSet[str]]:
+    """The keyword arguments a runner's runtest accepts, or None if it takes any
+
+    Custom runners may not accept the ones of the default runner (asyncio_runner etc.)
+    """
+    parameters = inspect.signature(runner.runtest).parameters.values()
+    if any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters):
+        return None
+    return frozenset(
+        parameter.name
+        for parameter in parameters
+        if parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY)
+    )
 
 
 def _get_asyncio_runner(fixture_request):
@@ -60,43 +375,311 @@ def _get_asyncio_runner(fixture_request):
         return None
 
 
+def _lifecycle_hooks_implemented(config: pytest.Config, phase: str) -> bool:
+    """If a plugin implements the before or after hook of a phase (parse, compile or exec)
+
+    Timings are only taken, and the hooks only called, if so.
+    """
+    return bool(
+        getattr(config.hook, f"pytest_markdown_docs_before_{phase}").get_hookimpls()
+        or getattr(config.hook, f"pytest_markdown_docs_after_{phase}").get_hookimpls()
+    )
+
+
+def _parse_with_lifecycle_hooks(
+    node: pytest.Collector,
+    parse: typing.Callable[[], typing.Iterable[T]],
+    fences_of: typing.Callable[[typing.List[T]], typing.Sequence[FenceTestDefinition]],
+) -> typing.Iterable[T]:
+    if not _lifecycle_hooks_implemented(node.config, "parse"):
+        return parse()
+    start = time.perf_counter()
+    node.ihook.pytest_markdown_docs_before_parse(path=node.path, start=start)
+    results: typing.List[T] = []
+    exception = None
+    try:
+        results = list(parse())
+    except BaseException as e:
+        exception = e
+        raise
+    finally:
+        node.ihook.pytest_markdown_docs_after_parse(
+            path=node.path,
+            fences=fences_of(results),
+            start=start,
+            duration=time.perf_counter() - start,
+            exception=exception,
+        )
+    return results
+
+
+def _run_with_lifecycle_hooks(
+    item: "MarkdownInlinePythonItem",
+    phase: str,
+    run: typing.Callable[[], None],
+    **kwargs: typing.Any,
+) -> None:
+    start = time.perf_counter()
+    getattr(item.ihook, f"pytest_markdown_docs_before_{phase}")(
+        item=item, start=start, **kwargs
+    )
+    exception = None
+    try:
+        run()
+    except BaseException as e:
+        exception = e
+        raise
+    finally:
+        getattr(item.ihook, f"pytest_markdown_docs_after_{phase}")(
+            item=item,
+            start=start,
+            duration=time.perf_counter() - start,
+            exception=exception,
+            **kwargs,
+        )
+
+
 class MarkdownInlinePythonItem(pytest.Item):
     def __init__(
         self,
         name: str,
-        parent: typing.Union["MarkdownDocstringCodeModule", "MarkdownTextFile"],
+        parent: typing.Union["MarkdownDocstringFile", "MarkdownTextFile"],
         test_definition: FenceTestDefinition,
+        previous_item: typing.Optional["MarkdownInlinePythonItem"] = None,
+        fence_id: typing.Optional[str] = None,
+        content_signature: str = "",
     ) -> None:
         super().__init__(name, parent)
+        # identifies the fence across sessions and edits elsewhere in its file,
+        # see fence_identity
+        self.fence_id = fence_id or self.nodeid
+        # changes whenever the fence (or a fence it depends on) changes, see fence_signature
+        self.content_signature = content_signature
         self.add_marker(MARKER_NAME)
-        self.code = test_definition.source
         self.obj = None
         self.test_definition = test_definition
-        self.user_properties.append(("code", test_definition.source))
         self.start_line = test_definition.start_line
         self.fixturenames = test_definition.fixture_names
         self.nofuncargs = True
         self.runner_name = test_definition.runner_name
+        # the item for the preceding block of a continuation chain, if any
+        self.previous_item = previous_item
+        self.chain_root: MarkdownInlinePythonItem = (
+            previous_item.chain_root if previous_item is not None else self
+        )
+        self.chain_position: int = (
+            previous_item.chain_position + 1 if previous_item is not None else 0
+        )
+        self.has_continuation = False
+        if previous_item is not None:
+            previous_item.has_continuation = True
+        # namespace left behind by this block, for use by its continuation
+        self._chain_namespace: typing.Optional[typing.Dict[str, typing.Any]] = None
 
-    def setup(self):
-        def func() -> None:
-            pass
+    def _get_fixtureinfo(self):
+        # also needed before setup, see _get_batch_mode
+        if not hasattr(self, "_fixtureinfo"):
 
+            def func() -> None:
+                pass
+
+            self._fixtureinfo = self.session._fixturemanager.getfixtureinfo(
+                node=self, func=func, cls=None
+            )
+        return self._fixtureinfo
+
+    def _get_runner(self) -> _Runner:
+        return get_runner(self.runner_name or self.config.option.markdowndocs_runner)
+
+    def setup(self):
         self.funcargs = {}
-        self._fixtureinfo = self.session._fixturemanager.getfixtureinfo(
-            node=self, func=func, cls=None
-        )
+        self._get_fixtureinfo()
         self.fixture_request = TopRequest(self, _ispytest=True)
         self.fixture_request._fillfixtures()
-        self.runner = get_runner(self.runner_name)
+        self.runner = self._get_runner()
+        if ("code", self.test_definition.block_content) not in self.user_properties:
+            # added here rather than when collecting, since reading the code of fences
+            # with lazily read sources is only worth it for fences that run
+            self.user_properties.append(("code", self.test_definition.block_content))
+        if isinstance(self.parent, MarkdownDocstringFile):
+            # statically collected modules are imported lazily, before the first fence runs
+            self.parent.import_module()
+
+    @property
+    def code(self) -> str:
+        return self.test_definition.source
+
+    def _take_previous_namespace(self) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Take over the namespace left by the previous block in the chain
+
+        Only available in incremental continuation mode, and only if the previous
+        block ran (and passed) earlier in this session. Otherwise the caller has to
+        fall back to re-running the whole chain.
+        """
+        if self.previous_item is None:
+            return None
+        namespace = self.previous_item._chain_namespace
+        self.previous_item._chain_namespace = None
+        return namespace
+
+    def _get_test_definition(self) -> FenceTestDefinition:
+        """The test definition, with the configured defaults applied"""
+        test_definition = self.test_definition
+        default_timeout = self.config.getini("markdown_docs_timeout")
+        if test_definition.timeout is None and default_timeout:
+            test_definition = dataclasses.replace(
+                test_definition, timeout=parse_timeout(default_timeout)
+            )
+        return test_definition
 
-    def runtest(self):
-        global_sets = self.parent.config.hook.pytest_markdown_docs_globals()
+    def _new_globals(self) -> typing.Dict[str, typing.Any]:
+        global_sets = self.config.hook.pytest_markdown_docs_globals()
 
         mod = types.ModuleType("fence")  # dummy module
         all_globals = mod.__dict__
+        assert isinstance(self.parent, pytest.Collector)
+        base_globals = get_base_globals(self.parent)
+        if base_globals is not None:
+            all_globals.update(base_globals)
         for global_set in global_sets:
             all_globals.update(global_set)
+        return all_globals
+
+    def _is_parallel_safe(self) -> bool:
+        if self.test_definition.parallel_safe:
+            return True
+        patterns = self.config.getini("markdown_docs_parallel_safe")
+        if not patterns:
+            return False
+        relative_path = bestrelpath(self.config.rootpath, self.path)
+        return any(fnmatch.fnmatch(relative_path, pattern) for pattern in patterns)
+
+    def _uses_fixtures(self) -> bool:
+        """If the fence requests fixtures, or autouse fixtures set up for each test apply
+
+        Autouse fixtures with a module, package or session scope are set up before the
+        first fence of a file runs, and stay set up until its last one has run.
+        """
+        if self.test_definition.fixture_names:
+            return True
+        fixtureinfo = self._get_fixtureinfo()
+        for name in fixtureinfo.names_closure:
+            fixturedefs = fixtureinfo.name2fixturedefs.get(name)
+            if fixturedefs and fixturedefs[-1].scope not in (
+                "module",
+                "package",
+                "session",
+            ):
+                return True
+        return False
+
+    def _get_batch_mode(self) -> typing.Optional[BatchMode]:
+        """How the fence runs together with other fences of its file, if it does
+
+        That's async fences with the `concurrent` option and parallel-safe fences,
+        if they don't use fixtures and aren't part of a continuation chain. All fences
+        of a batch run when the first one does - before the setup of the others, so
+        the fixtures of the others couldn't be set up around them. Under xdist, the
+        other fences of the file may be scheduled to other workers, so fences are run
+        one by one.
+        """
+        test_definition = self.test_definition
+        if (
+            self.previous_item is not None
+            or self.has_continuation
+            or hasattr(self.config, "workerinput")
+            # fences are profiled one at a time
+            or self.config.option.markdowndocs_profile is not None
+        ):
+            return None
+        runner = self._get_runner()
+        if (
+            not isinstance(runner, DefaultRunner)
+            or not runner.supports_concurrency
+            # a batch runs the code of the fences itself, which would skip the runtest
+            # of a subclass
+            or type(runner).runtest is not DefaultRunner.runtest
+        ):
+            return None
+        if not (test_definition.concurrent or self._is_parallel_safe()):
+            return None
+        if self._uses_fixtures():
+            return None
+        if test_definition.concurrent:
+            try:
+                if runner.is_async(test_definition):
+                    return BatchMode.concurrent
+            except SyntaxError:
+                # reported when running the fence on its own
+                return None
+        if self._is_parallel_safe():
+            return BatchMode.threaded
+        return None
+
+    def _runtest_in_batch(self, batch_mode: BatchMode, asyncio_runner) -> None:
+        """Run the fence, together with the other fences of the file of the same mode
+
+        The first of them to run runs all of them, the others report their outcomes.
+        """
+        assert self.parent is not None
+        outcomes = self.parent.stash.setdefault(_batch_outcomes_key, {})
+        if self.nodeid not in outcomes:
+            batch = [
+                item
+                for item in self.session.items
+                if isinstance(item, MarkdownInlinePythonItem)
+                and item.parent is self.parent
+                and item.nodeid not in outcomes
+                and item._get_batch_mode() == batch_mode
+                and item._get_runner() is self.runner
+            ]
+            tests = [
+                (item._get_test_definition(), item._new_globals()) for item in batch
+            ]
+            capman = self.config.pluginmanager.getplugin("capturemanager")
+            with capman.global_and_fixture_disabled():
+                if batch_mode == BatchMode.concurrent:
+                    results = self.runner.runtest_concurrently(
+                        tests, asyncio_runner=asyncio_runner
+                    )
+                else:
+                    results = self.runner.runtest_threaded(
+                        tests,
+                        max_workers=self.config.option.markdowndocs_threads
+                        or _default_thread_count(),
+                    )
+            outcomes.update(zip((item.nodeid for item in batch), results))
+        outcome = outcomes[self.nodeid]
+        for name, content in (("stdout", outcome.stdout), ("stderr", outcome.stderr)):
+            if content:
+                self.add_report_section("call", name, content)
+        if outcome.exception is not None:
+            raise outcome.exception
+
+    def runtest(self):
+        batch_mode = self._get_batch_mode()
+        if batch_mode == BatchMode.threaded:
+            self._runtest_in_batch(batch_mode, None)
+            return
+        if batch_mode == BatchMode.concurrent:
+            asyncio_runner = _get_asyncio_runner(self.fixture_request)
+            if asyncio_runner is not None:
+                self._runtest_in_batch(batch_mode, asyncio_runner)
+                return
+
+        incremental = (
+            ContinuationMode(self.config.option.markdowndocs_continuation)
+            == ContinuationMode.incremental
+        )
+        test_definition = self._get_test_definition()
+        all_globals = self._take_previous_namespace() if incremental else None
+        if all_globals is not None:
+            # only execute the new block, on top of the state of the chain so far
+            test_definition = dataclasses.replace(
+                test_definition, chain_start=test_definition.block_index
+            )
+        else:
+            all_globals = self._new_globals()
 
         # make sure to evaluate fixtures
         # this will insert named fixtures into self.funcargs
@@ -108,31 +691,85 @@ class MarkdownInlinePythonItem(pytest.Item):
         for argname, value in self.funcargs.items():
             all_globals[argname] = value
 
+        if isinstance(self.runner, DefaultRunner) and _lifecycle_hooks_implemented(
+            self.config, "compile"
+        ):
+            try:
+                # the runner reuses the compiled code
+                _run_with_lifecycle_hooks(
+                    self, "compile", lambda: self.runner.compile(test_definition)
+                )
+            except SyntaxError:
+                # reported when running the fence, as without the hooks
+                pass
+
+        profiler = None
+        if self.config.option.markdowndocs_profile is not None and self._can_profile():
+            profiler = cProfile.Profile()
+        try:
+            self._runtest_attempts(test_definition, all_globals, incremental, profiler)
+        finally:
+            if profiler is not None:
+                self._save_profile(profiler)
+
+    def _can_profile(self) -> bool:
+        if not self.runner.supports_profiling:
+            return False
+        accepted = _runtest_keywords(self.runner)
+        return accepted is None or "profiler" in accepted
+
+    def _save_profile(self, profiler: cProfile.Profile) -> None:
+        directory = pathlib.Path(self.config.option.markdowndocs_profile)
+        path = profile_path(
+            self.config.invocation_params.dir / directory, self.fence_id
+        )
+        profiler.dump_stats(path)
+        self.stash[_profile_key] = {
+            "path": str(path),
+            "source": str(self.test_definition.source_path),
+            "line": self.start_line,
+        }
+
+    def _runtest_attempts(
+        self,
+        test_definition: FenceTestDefinition,
+        all_globals: typing.Dict[str, typing.Any],
+        incremental: bool,
+        profiler: typing.Optional[cProfile.Profile],
+    ) -> None:
         # Retry logic
         max_retries = self.test_definition.max_retries
         max_attempts = max_retries + 1  # +1 for initial attempt
 
+        exec_hooks = _lifecycle_hooks_implemented(self.config, "exec")
         last_exception = None
         for attempt in range(max_attempts):
+            # every attempt starts out from the namespace the fence got, rather than
+            # the one a failed attempt left behind (e.g. one inherited incrementally)
+            namespace = dict(all_globals) if max_attempts > 1 else all_globals
             try:
-                # this ensures that pytest's stdout/stderr capture works during the test:
-                capman = self.config.pluginmanager.getplugin("capturemanager")
-                asyncio_runner = _get_asyncio_runner(self.fixture_request)
-                with capman.global_and_fixture_disabled():
-                    try:
-                        self.runner.runtest(
-                            self.test_definition,
-                            all_globals,
-                            asyncio_runner=asyncio_runner,
-                        )
-                    except TypeError:
-                        # Custom runner doesn't accept asyncio_runner kwarg
-                        self.runner.runtest(self.test_definition, all_globals)
+                if exec_hooks:
+                    _run_with_lifecycle_hooks(
+                        self,
+                        "exec",
+                        lambda: self._runtest_once(
+                            test_definition, namespace, profiler
+                        ),
+                        attempt=attempt,
+                    )
+                else:
+                    self._runtest_once(test_definition, namespace, profiler)
 
                 # Success - test passed
                 if attempt > 0:
                     # Record retry count for reporting
                     self.user_properties.append(("retries", str(attempt)))
+                if (
+                    incremental
+                    and self.has_continuation
+                    and self.runner.shares_namespace
+                ):
+                    self._chain_namespace = namespace
                 return
 
             except Exception as e:
@@ -148,6 +785,26 @@ class MarkdownInlinePythonItem(pytest.Item):
         if last_exception:
             raise last_exception
 
+    def _runtest_once(
+        self,
+        test_definition: FenceTestDefinition,
+        all_globals: typing.Dict[str, typing.Any],
+        profiler: typing.Optional[cProfile.Profile],
+    ) -> None:
+        # this ensures that pytest's stdout/stderr capture works during the test:
+        capman = self.config.pluginmanager.getplugin("capturemanager")
+        asyncio_runner = _get_asyncio_runner(self.fixture_request)
+        runner_kwargs: typing.Dict[str, typing.Any] = {"asyncio_runner": asyncio_runner}
+        if profiler is not None:
+            runner_kwargs["profiler"] = profiler
+        accepted = _runtest_keywords(self.runner)
+        if accepted is not None:
+            runner_kwargs = {
+                name: value for name, value in runner_kwargs.items() if name in accepted
+            }
+        with capman.global_and_fixture_disabled():
+            self.runner.runtest(test_definition, all_globals, **runner_kwargs)
+
     def repr_failure(
         self,
         excinfo: ExceptionInfo[BaseException],
@@ -159,6 +816,35 @@ class MarkdownInlinePythonItem(pytest.Item):
         return self.path, self.start_line, self.name
 
 
+def fence_identity(
+    scope: str,
+    fence_test: FenceTestDefinition,
+    chain_position: int,
+    seen: typing.Counter[typing.Tuple[str, str]],
+) -> str:
+    """A stable identity for a code fence, based on its content
+
+    Unlike the line number in node ids, it doesn't change when other parts of the file
+    are edited. Continuation blocks get their position in the chain appended, and
+    identical fences in the same scope (file or docstring) are numbered.
+    """
+    identity = fence_test.block_digest[:12]
+    if chain_position:
+        identity += f"+{chain_position}"
+    seen[scope, identity] += 1
+    if seen[scope, identity] > 1:
+        identity += f"#{seen[scope, identity]}"
+    return identity
+
+
+def fence_test_name(
+    fence_ids: FenceIds, index: int, fence_test: FenceTestDefinition, identity: str
+) -> str:
+    if fence_ids == FenceIds.content:
+        return f"[CodeFence:{identity}]"
+    return f"[CodeFence#{index + 1}][line:{fence_test.start_line}]"
+
+
 def get_prefixed_strings(
     seq: typing.Collection[str], prefix: str
 ) -> typing.Sequence[str]:
@@ -166,6 +852,65 @@ def get_prefixed_strings(
     return tuple(s[len(prefix) :] for s in seq if s.startswith(prefix))
 
 
+def iter_markdown_it_fences(
+    markdown_it_parser: "MarkdownIt", markdown_string: str
+) -> typing.Generator[Fence, None, None]:
+    yield from _fences_from_tokens(markdown_it_parser.parse(markdown_string), None)
+
+
+def iter_markdown_it_fences_streaming(
+    markdown_it_parser: "MarkdownIt",
+    lines: typing.Iterable[str],
+    chunk_size: int,
+) -> typing.Generator[Fence, None, None]:
+    """The fences of a document given as lines, tokenized a chunk at a time
+
+    Only the tokens of a single chunk of the document are kept in memory at a time.
+    """
+    tokens: typing.Optional[typing.List["Token"]] = None
+    for chunk in split_markdown(lines, chunk_size):
+        if tokens is None:
+            # the first chunk, or the previous one was skipped
+            preceding_inline = chunk.preceding_inline
+        elif len(tokens) >= 2 and tokens[-2].type == "inline":
+            preceding_inline = tokens[-2].content
+        else:
+            preceding_inline = None
+        if "```" not in chunk.text and "~~~" not in chunk.text:
+            tokens = None
+            continue
+        tokens = markdown_it_parser.parse(chunk.text)
+        for fence in _fences_from_tokens(tokens, preceding_inline):
+            yield fence._replace(line=fence.line + chunk.line)
+
+
+def _fences_from_tokens(
+    tokens: typing.Sequence["Token"], previous_inline: typing.Optional[str]
+) -> typing.Generator[Fence, None, None]:
+    """The fences of tokens, given the inline content preceding the first token"""
+    for i, block in enumerate(tokens):
+        if block.type != "fence" or not block.map:
+            continue
+
+        # In MDX, comments are enclosed within a paragraph block and must be
+        # placed directly above the corresponding code fence. The token
+        # sequence is as follows:
+        #   i-3: paragraph_open
+        #   i-2: comment
+        #   i-1: paragraph_close
+        #   i: code fence
+        #
+        # Therefore, to retrieve the MDX comment associated with the current
+        # code fence (at index `i`), we need to access the token at `i - 2`.
+        preceding_inline = None
+        if i >= 2 and tokens[i - 2].type == "inline":
+            preceding_inline = tokens[i - 2].content
+        elif i == 0:
+            preceding_inline = previous_inline
+
+        yield Fence(block.info, block.content, block.map[0], preceding_inline)
+
+
 def extract_fence_tests(
     markdown_it_parser: "MarkdownIt",
     markdown_string: str,
@@ -173,14 +918,98 @@ def extract_fence_tests(
     source_path: pathlib.Path,
     markdown_type: str = "md",
     fence_syntax: FenceSyntax = FenceSyntax.default,
+    fence_parser: FenceParser = FenceParser.markdown_it,
 ) -> typing.Generator[FenceTestDefinition, None, None]:
-    tokens = markdown_it_parser.parse(markdown_string)
+    if "```" not in markdown_string and "~~~" not in markdown_string:
+        # can't contain any fenced code blocks - skip tokenizing
+        return
 
-    prev = ""
-    for i, block in enumerate(tokens):
-        if block.type != "fence" or not block.map:
-            continue
+    if fence_parser == FenceParser.fast:
+        fences = scan_fences(markdown_string)
+    else:
+        fences = iter_markdown_it_fences(markdown_it_parser, markdown_string)
+
+    yield from fence_tests_from_fences(
+        fences, start_line_offset, source_path, markdown_type, fence_syntax
+    )
+
+
+def extract_fence_tests_from_file(
+    markdown_it_parser: "MarkdownIt",
+    path: pathlib.Path,
+    markdown_type: str,
+    fence_syntax: FenceSyntax,
+    fence_parser: FenceParser,
+) -> typing.List[FenceTestDefinition]:
+    """Extract the fence tests of a markdown file
+
+    Large files are scanned from a memory map with the fast parser, with the content
+    of fences left in the file until it's needed (e.g. for running the fence). With
+    markdown-it, they are read and tokenized a chunk at a time instead.
+    """
+    large = path.stat().st_size >= LARGE_FILE_MIN_SIZE
+    if large and fence_parser == FenceParser.markdown_it:
+        with path.open(encoding="utf8") as lines:
+            return list(
+                fence_tests_from_fences(
+                    iter_markdown_it_fences_streaming(
+                        markdown_it_parser, lines, STREAMING_CHUNK_SIZE
+                    ),
+                    0,
+                    path,
+                    markdown_type,
+                    fence_syntax,
+                )
+            )
+    if large and fence_parser == FenceParser.fast:
+        # nested, since parenthesized context managers need python 3.10
+        with path.open("rb") as markdown_file:
+            with mmap.mmap(
+                markdown_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buffer:
+                if can_scan_lazily(buffer):
+                    if buffer.find(b"```") == -1 and buffer.find(b"~~~") == -1:
+                        return []
+                    with memoryview(buffer) as view:
+                        return list(
+                            fence_tests_from_fences(
+                                scan_fences_lazily(buffer),
+                                0,
+                                path,
+                                markdown_type,
+                                fence_syntax,
+                                view,
+                            )
+                        )
+    return list(
+        extract_fence_tests(
+            markdown_it_parser,
+            path.read_text("utf8"),
+            start_line_offset=0,
+            source_path=path,
+            markdown_type=markdown_type,
+            fence_syntax=fence_syntax,
+            fence_parser=fence_parser,
+        )
+    )
 
+
+def fence_tests_from_fences(
+    fences: typing.Iterable[Fence],
+    start_line_offset: int,
+    source_path: pathlib.Path,
+    markdown_type: str,
+    fence_syntax: FenceSyntax,
+    buffer: typing.Optional[memoryview] = None,
+) -> typing.Generator[FenceTestDefinition, None, None]:
+    """Fence tests for the python fences, given all the fences of a document
+
+    Fences scanned lazily refer to their content by its span in the buffer.
+    """
+    # shared by the definitions of all the fences
+    blocks: typing.List[FenceBlock] = []
+    chain_start = 0
+    for block in fences:
         if fence_syntax == FenceSyntax.superfences:
             code_info = parse_superfences_block_info(block.info)
         else:
@@ -189,29 +1018,19 @@ def extract_fence_tests(
         lang = code_info[0] if code_info else None
         code_options = set(code_info) - {lang}
 
-        if markdown_type == "mdx":
-            # In MDX, comments are enclosed within a paragraph block and must be
-            # placed directly above the corresponding code fence. The token
-            # sequence is as follows:
-            #   i-3: paragraph_open
-            #   i-2: comment
-            #   i-1: paragraph_close
-            #   i: code fence
-            #
-            # Therefore, to retrieve the MDX comment associated with the current
-            # code fence (at index `i`), we need to access the token at `i - 2`.
-            if i >= 2 and is_mdx_comment(tokens[i - 2]):
-                code_options |= extract_options_from_mdx_comment(tokens[i - 2].content)
+        if (
+            markdown_type == "mdx"
+            and block.preceding_inline is not None
+            and is_mdx_comment_text(block.preceding_inline)
+        ):
+            code_options |= extract_options_from_mdx_comment(block.preceding_inline)
 
         if lang in ("py", "python", "python3") and "notest" not in code_options:
             start_line = (
-                start_line_offset + block.map[0] + 1
+                start_line_offset + block.line + 1
             )  # actual code starts on +1 from the "info" line
-            if "continuation" not in code_options:
-                prev = ""
-
-            add_blank_lines = start_line - prev.count("\n")
-            code_block = prev + ("\n" * add_blank_lines) + block.content
+            if "continuation" not in code_options or not blocks:
+                chain_start = len(blocks)
 
             fixture_names = get_prefixed_strings(code_options, "fixture:")
             runner_names = get_prefixed_strings(code_options, "runner:")
@@ -241,15 +1060,53 @@ def extract_fence_tests(
                         f"Invalid retry count '{retry_counts[0]}': must be a non-negative integer"
                     ) from e
 
+            timeouts = get_prefixed_strings(code_options, "timeout:")
+            if len(timeouts) == 0:
+                timeout = None
+            elif len(timeouts) > 1:
+                raise Exception(
+                    f"Multiple timeouts are not supported, use a single one instead: {timeouts}"
+                )
+            else:
+                timeout = parse_timeout(timeouts[0])
+
+            if block.span is None:
+                blocks.append(FenceBlock(block.content, start_line))
+            else:
+                assert buffer is not None
+                offset, end = block.span
+                blocks.append(
+                    FenceBlock(
+                        None,
+                        start_line,
+                        FileSlice(source_path, offset, end - offset),
+                        hashlib.sha256(buffer[offset:end]).hexdigest(),
+                    )
+                )
             yield FenceTestDefinition(
-                code_block,
+                blocks,
+                len(blocks) - 1,
+                chain_start,
                 fixture_names,
-                start_line,
                 source_path=source_path,
                 runner_name=runner_name,
                 max_retries=max_retries,
+                timeout=timeout,
+                concurrent="concurrent" in code_options,
+                parallel_safe="parallel-safe" in code_options,
             )
-            prev = code_block
+
+
+def parse_timeout(value: str) -> float:
+    try:
+        timeout = float(value)
+        if timeout <= 0:
+            raise ValueError("Timeout must be positive")
+    except ValueError as e:
+        raise Exception(
+            f"Invalid timeout '{value}': must be a positive number of seconds"
+        ) from e
+    return timeout
 
 
 def parse_superfences_block_info(block_info: str) -> typing.List[str]:
@@ -281,11 +1138,14 @@ def parse_superfences_block_info(block_info: str) -> typing.List[str]:
 
 
 def is_mdx_comment(block: "Token") -> bool:
+    return block.type == "inline" and is_mdx_comment_text(block.content)
+
+
+def is_mdx_comment_text(content: str) -> bool:
     return (
-        block.type == "inline"
-        and block.content.strip().startswith("{/*")
-        and block.content.strip().endswith("*/}")
-        and "pmd-metadata:" in block.content
+        content.strip().startswith("{/*")
+        and content.strip().endswith("*/}")
+        and "pmd-metadata:" in content
     )
 
 
@@ -320,85 +1180,169 @@ def _preprocess_async_fixtures_if_available(collector: pytest.Collector) -> None
         pass
 
 
-class MarkdownDocstringCodeModule(pytest.Module):
+def find_object_tests_in_source(
+    source: typing.Union[str, bytes],
+    module_name: str,
+    source_path: pathlib.Path,
+    markdown_it_parser: "MarkdownIt",
+    fence_syntax: FenceSyntax,
+    fence_parser: FenceParser,
+) -> typing.Generator[ObjectTestDefinition, None, None]:
+    """Find the fence tests in the docstrings of a python module without importing it"""
+    yield from object_tests_from_docstrings(
+        find_docstrings_static(source, module_name),
+        source_path,
+        markdown_it_parser,
+        fence_syntax,
+        fence_parser,
+    )
+
+
+def object_tests_from_docstrings(
+    docstrings: typing.Iterable[typing.Tuple[str, str, int]],
+    source_path: pathlib.Path,
+    markdown_it_parser: "MarkdownIt",
+    fence_syntax: FenceSyntax,
+    fence_parser: FenceParser,
+) -> typing.Generator[ObjectTestDefinition, None, None]:
+    """The fence tests of (qualified name, docstring, line offset) tuples"""
+    for obj_name, docstr, docstring_offset in docstrings:
+        for i, fence_test in enumerate(
+            extract_fence_tests(
+                markdown_it_parser,
+                docstr,
+                docstring_offset,
+                source_path=source_path,
+                fence_syntax=fence_syntax,
+                fence_parser=fence_parser,
+            )
+        ):
+            yield ObjectTestDefinition(i, obj_name, fence_test, content_digest(docstr))
+
+
+class MarkdownDocstringFile(pytest.File):
+    """Collects the code fences in the docstrings of a python module
+
+    In ast mode (see --markdown-docs-docstring-collection), the module is only
+    imported once one of its fences runs. This isn't a `pytest.Module`, since plugins
+    (e.g. pytest-asyncio 0.23) access `obj` of those, importing the module.
+    """
+
+    _module: typing.Optional[types.ModuleType] = None
+
     def collect(self):
         # Trigger pytest-asyncio's async fixture preprocessing if available
         # (needed for pytest-asyncio 0.23.x; 1.x uses pytest_fixture_setup hook instead)
         _preprocess_async_fixtures_if_available(self)
 
-        if pytest.version_tuple >= (8, 1, 0):
-            # consider_namespace_packages is a required keyword argument in pytest 8.1.0
-            module = import_path(
-                self.path, root=self.config.rootpath, consider_namespace_packages=True
-            )
+        collection = DocstringCollection(
+            self.config.option.markdowndocs_docstring_collection
+        )
+        if collection == DocstringCollection.ast:
+            # the module is only imported once one of its fences runs
+            parse = self.find_object_tests_static
         else:
-            # but unsupported before pytest 8.1...
-            module = import_path(self.path, root=self.config.rootpath)
+            module = self.import_module()
+
+            def parse() -> typing.Iterable[ObjectTestDefinition]:
+                return object_tests_from_docstrings(
+                    find_docstrings_in_module(module, self.path.read_bytes()),
+                    self.path,
+                    get_markdown_it_parser(self.config),
+                    FenceSyntax(self.config.option.markdowndocs_syntax),
+                    FenceParser(self.config.option.markdowndocs_parser),
+                )
 
-        for object_test in self.find_object_tests_recursive(
-            module.__name__, module, set(), set()
-        ):
+        object_tests = _parse_with_lifecycle_hooks(
+            self,
+            parse,
+            lambda object_tests: [
+                object_test.fence_test for object_test in object_tests
+            ],
+        )
+
+        fence_ids = FenceIds(self.config.option.markdowndocs_ids)
+        prev_item = None
+        seen: typing.Counter[typing.Tuple[str, str]] = collections.Counter()
+        for object_test in object_tests:
             fence_test = object_test.fence_test
-            yield MarkdownInlinePythonItem.from_parent(
+            previous_item = prev_item if fence_test.continuation else None
+            identity = fence_identity(
+                object_test.object_name,
+                fence_test,
+                previous_item.chain_position + 1 if previous_item else 0,
+                seen,
+            )
+            name = fence_test_name(
+                fence_ids, object_test.intra_object_index, fence_test, identity
+            )
+            prev_item = MarkdownInlinePythonItem.from_parent(
                 self,
-                name=f"{object_test.object_name}[CodeFence#{object_test.intra_object_index + 1}][line:{fence_test.start_line}]",
+                name=f"{object_test.object_name}{name}",
                 test_definition=fence_test,
+                previous_item=previous_item,
+                fence_id=f"{self.nodeid}::{object_test.object_name}::{identity}",
+                content_signature=fence_signature(
+                    f"{self.nodeid}\0{object_test.docstring_digest}",
+                    prev_item.content_signature if prev_item else None,
+                    fence_test,
+                ),
+            )
+            yield prev_item
+
+    def import_module(self) -> types.ModuleType:
+        if self._module is None:
+            self._module = find_imported_module(self.path, self.config.rootpath)
+        if self._module is None:
+            import_path_kwargs: typing.Dict[str, typing.Any] = {}
+            if pytest.version_tuple >= (8, 1, 0):
+                # consider_namespace_packages is a required keyword argument in
+                # pytest 8.1.0, but unsupported before pytest 8.1...
+                import_path_kwargs["consider_namespace_packages"] = True
+            self._module = import_path(
+                self.path, root=self.config.rootpath, **import_path_kwargs
             )
+        return self._module
 
-    def find_object_tests_recursive(
-        self,
-        module_name: str,
-        object: typing.Any,
-        _visited_objects: typing.Set[int],
-        _found_tests: typing.Set[typing.Tuple[str, int]],
-    ) -> typing.Generator[ObjectTestDefinition, None, None]:
-        if id(object) in _visited_objects:
-            return
-        _visited_objects.add(id(object))
-        docstr = inspect.getdoc(object)
-
-        for member_name, member in inspect.getmembers(object):
-            if (
-                inspect.isclass(member)
-                or inspect.isfunction(member)
-                or inspect.ismethod(member)
-            ) and member.__module__ == module_name:
-                yield from self.find_object_tests_recursive(
-                    module_name, member, _visited_objects, _found_tests
-                )
+    def find_object_tests_static(self) -> typing.List[ObjectTestDefinition]:
+        fence_syntax = FenceSyntax(self.config.option.markdowndocs_syntax)
+        fence_parser = FenceParser(self.config.option.markdowndocs_parser)
+        markdown_it_parser = get_markdown_it_parser(self.config)
+        module_name = module_name_from_path(self.path)
+
+        collection_cache = get_collection_cache(
+            self.config,
+            markdown_it_parser,
+            "docstrings",
+            fence_syntax.value,
+            fence_parser.value,
+            module_name,
+        )
+        if collection_cache is not None:
+            cached, stamp = collection_cache.load(self.path)
+            if cached is not None:
+                return object_tests_from_json(cached)
+
+        object_tests = list(
+            find_object_tests_in_source(
+                self.path.read_bytes(),
+                module_name,
+                self.path,
+                markdown_it_parser,
+                fence_syntax,
+                fence_parser,
+            )
+        )
+        if collection_cache is not None:
+            collection_cache.store(
+                stamp,
+                object_tests_to_json(object_tests),
+            )
+        return object_tests
 
-        if docstr:
-            docstring_offset = get_docstring_start_line(object)
-            if docstring_offset is None:
-                logger.warning(
-                    f"Could not find line number offset for docstring: {docstr}"
-                )
-            else:
-                obj_name = (
-                    getattr(object, "__qualname__", None)
-                    or getattr(object, "__name__", None)
-                    or "<Unnamed obj>"
-                )
-                fence_syntax = FenceSyntax(self.config.option.markdowndocs_syntax)
-                markdown_it_parser = self.config.hook.pytest_markdown_docs_markdown_it()
-
-                for i, fence_test in enumerate(
-                    extract_fence_tests(
-                        markdown_it_parser,
-                        docstr,
-                        docstring_offset,
-                        source_path=self.path,
-                        fence_syntax=fence_syntax,
-                    )
-                ):
-                    found_test = ObjectTestDefinition(i, obj_name, fence_test)
-                    found_test_location = (
-                        module_name,
-                        found_test.fence_test.start_line,
-                    )
-                    if found_test_location not in _found_tests:
-                        _found_tests.add(found_test_location)
-                        yield found_test
+
+class MarkdownDocstringCodeModule(MarkdownDocstringFile, pytest.Module):
+    """Collects the code fences in the docstrings of an imported python module"""
 
 
 class MarkdownTextFile(pytest.File):
@@ -407,28 +1351,249 @@ class MarkdownTextFile(pytest.File):
         # (needed for pytest-asyncio 0.23.x; 1.x uses pytest_fixture_setup hook instead)
         _preprocess_async_fixtures_if_available(self)
 
-        markdown_content = self.path.read_text("utf8")
         fence_syntax = FenceSyntax(self.config.option.markdowndocs_syntax)
-
-        markdown_it_parser = self.config.hook.pytest_markdown_docs_markdown_it()
-
-        for i, fence_test in enumerate(
-            extract_fence_tests(
-                markdown_it_parser,
-                markdown_content,
-                source_path=self.path,
-                start_line_offset=0,
-                markdown_type=self.path.suffix.replace(".", ""),
-                fence_syntax=fence_syntax,
+        fence_parser = FenceParser(self.config.option.markdowndocs_parser)
+        markdown_type = self.path.suffix.replace(".", "")
+
+        markdown_it_parser = get_markdown_it_parser(self.config)
+
+        fence_ids = FenceIds(self.config.option.markdowndocs_ids)
+        prev_item = None
+        seen: typing.Counter[typing.Tuple[str, str]] = collections.Counter()
+        fence_tests = _parse_with_lifecycle_hooks(
+            self,
+            lambda: self.find_fence_tests(
+                markdown_it_parser, markdown_type, fence_syntax, fence_parser
+            ),
+            lambda fence_tests: fence_tests,
+        )
+        for i, fence_test in enumerate(fence_tests):
+            previous_item = prev_item if fence_test.continuation else None
+            identity = fence_identity(
+                "",
+                fence_test,
+                previous_item.chain_position + 1 if previous_item else 0,
+                seen,
             )
-        ):
-            yield MarkdownInlinePythonItem.from_parent(
+            prev_item = MarkdownInlinePythonItem.from_parent(
                 self,
-                name=f"[CodeFence#{i + 1}][line:{fence_test.start_line}]",
+                name=fence_test_name(fence_ids, i, fence_test, identity),
                 test_definition=fence_test,
+                previous_item=previous_item,
+                fence_id=f"{self.nodeid}::{identity}",
+                content_signature=fence_signature(
+                    self.nodeid,
+                    prev_item.content_signature if prev_item else None,
+                    fence_test,
+                ),
+            )
+            yield prev_item
+
+    def find_fence_tests(
+        self,
+        markdown_it_parser: "MarkdownIt",
+        markdown_type: str,
+        fence_syntax: FenceSyntax,
+        fence_parser: FenceParser,
+    ) -> typing.List[FenceTestDefinition]:
+        collection_cache = get_collection_cache(
+            self.config,
+            markdown_it_parser,
+            markdown_type,
+            fence_syntax.value,
+            fence_parser.value,
+        )
+        if collection_cache is not None:
+            cached, stamp = collection_cache.load(self.path)
+            if cached is not None:
+                return fence_tests_from_json(cached)
+
+        preparsed = self.config.stash.get(_preparsed_key, None)
+        if (
+            preparsed is not None
+            and (preparsed[0] is markdown_it_parser or fence_parser == FenceParser.fast)
+            and self.path in preparsed[1]
+        ):
+            fence_tests = preparsed[1].pop(self.path)
+        else:
+            fence_tests = extract_fence_tests_from_file(
+                markdown_it_parser,
+                self.path,
+                markdown_type,
+                fence_syntax,
+                fence_parser,
+            )
+        if collection_cache is not None:
+            collection_cache.store(stamp, fence_tests_to_json(fence_tests))
+        return fence_tests
+
+
+_preparse_args: typing.Tuple["MarkdownIt", FenceSyntax, FenceParser]
+
+
+def _init_preparse_worker(
+    markdown_it_parser: typing.Optional["MarkdownIt"],
+    fence_syntax: FenceSyntax,
+    fence_parser: FenceParser,
+) -> None:
+    global _preparse_args
+    if markdown_it_parser is None:
+        # not passed to workers that aren't forked, which only use the fast parser
+        from markdown_it import MarkdownIt
+
+        markdown_it_parser = MarkdownIt()
+    _preparse_args = (markdown_it_parser, fence_syntax, fence_parser)
+
+
+def _preparse_markdown_file(
+    path: pathlib.Path,
+) -> typing.Optional[typing.List[FenceTestDefinition]]:
+    markdown_it_parser, fence_syntax, fence_parser = _preparse_args
+    try:
+        return extract_fence_tests_from_file(
+            markdown_it_parser,
+            path,
+            path.suffix.replace(".", ""),
+            fence_syntax,
+            fence_parser,
+        )
+    except Exception:
+        # parsed (and the error reported) again when the file is collected
+        return None
+
+
+def find_markdown_files(config: pytest.Config) -> typing.List[pathlib.Path]:
+    """Markdown files that are likely to be collected, for parsing them ahead of time
+
+    This only approximates pytest's own collection (e.g. `norecursedirs` and the
+    include/exclude patterns are respected, `conftest.py` ignore rules aren't). Files
+    missing here are just parsed during collection, like without pre-parsing.
+    """
+    norecursedirs = config.getini("norecursedirs")
+    markdown_filter = config.stash[_markdown_filter_key]
+    paths: typing.List[pathlib.Path] = []
+    for arg in config.args:
+        path = config.invocation_params.dir / arg.split("::")[0]
+        if path.is_file():
+            if path.suffix in MARKDOWN_SUFFIXES and markdown_filter.includes(path):
+                paths.append(pathlib.Path(os.path.abspath(path)))
+            continue
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(path)):
+            dirnames[:] = sorted(
+                name
+                for name in dirnames
+                if not any(fnmatch.fnmatch(name, pattern) for pattern in norecursedirs)
+                and not markdown_filter.prunes(pathlib.Path(dirpath, name))
+            )
+            paths.extend(
+                pathlib.Path(dirpath, name)
+                for name in sorted(filenames)
+                if os.path.splitext(name)[1] in MARKDOWN_SUFFIXES
+                and markdown_filter.includes(pathlib.Path(dirpath, name))
             )
+    return paths
+
+
+def preparse_markdown_files(config: pytest.Config, jobs: int) -> None:
+    """Extract the fence tests of all markdown files using a pool of worker processes
+
+    Workers are forked, so they share the session's markdown parser. Where forking
+    isn't supported, only the fast parser (which needs no markdown parser) is used
+    in the workers.
+    """
+    fence_syntax = FenceSyntax(config.option.markdowndocs_syntax)
+    fence_parser = FenceParser(config.option.markdowndocs_parser)
+    markdown_it_parser = get_markdown_it_parser(config)
+
+    mp_context: multiprocessing.context.BaseContext
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+    elif fence_parser == FenceParser.fast:
+        mp_context = multiprocessing.get_context()
+    else:
+        return
+
+    def is_cached(path: pathlib.Path) -> bool:
+        collection_cache = get_collection_cache(
+            config,
+            markdown_it_parser,
+            path.suffix.replace(".", ""),
+            fence_syntax.value,
+            fence_parser.value,
+        )
+        return (
+            collection_cache is not None and collection_cache.load(path)[0] is not None
+        )
+
+    paths = [path for path in find_markdown_files(config) if not is_cached(path)]
+    results: typing.Dict[pathlib.Path, typing.List[FenceTestDefinition]] = {}
+    config.stash[_preparsed_key] = (markdown_it_parser, results)
+    if len(paths) < 2:
+        return
+
+    initargs: typing.Tuple[typing.Optional["MarkdownIt"], FenceSyntax, FenceParser] = (
+        markdown_it_parser if mp_context.get_start_method() == "fork" else None,
+        fence_syntax,
+        fence_parser,
+    )
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=mp_context,
+        initializer=_init_preparse_worker,
+        initargs=initargs,
+    ) as executor:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        try:
+            for path, fence_tests in zip(
+                paths,
+                executor.map(_preparse_markdown_file, paths, chunksize=chunksize),
+            ):
+                if fence_tests is not None:
+                    results[path] = fence_tests
+        except concurrent.futures.BrokenExecutor:
+            # e.g. a worker was killed - the remaining files are parsed on collection
+            logger.warning("markdown-docs: pre-parsing markdown files failed")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection(session: pytest.Session) -> None:
+    config = session.config
+    jobs = config.option.markdowndocs_collection_jobs
+    if not (config.option.markdowndocs and jobs) or config.pluginmanager.hasplugin(
+        "dsession"
+    ):
+        # the xdist controller doesn't collect anything itself
+        return
+    if hasattr(config, "workerinput"):
+        # every xdist worker collects all files, so they share the CPUs between them
+        workers = config.workerinput.get("workercount") or 1
+        jobs = min(jobs, (os.cpu_count() or 1) // workers)
+    if jobs > 1:
+        preparse_markdown_files(config, jobs)
+
+
+def pytest_ignore_collect(collection_path: pathlib.Path, config: pytest.Config):
+    """Prune directories excluded for both markdown files and docstrings, if enabled"""
+    if not (
+        config.option.markdowndocs and config.getini("markdown_docs_prune_excluded")
+    ):
+        return None
+    markdown_filter = config.stash[_markdown_filter_key]
+    docstring_filter = config.stash[_docstring_filter_key]
+    if not (markdown_filter.exclude and docstring_filter.exclude):
+        return None
+    if (
+        markdown_filter.excludes(collection_path)
+        and docstring_filter.excludes(collection_path)
+        and collection_path.is_dir()
+    ):
+        return True
+    return None
 
 
+# after pytest's own collectors, so test modules are imported (by its Module collector)
+# before their docstrings are collected, and can be reused
+@pytest.hookimpl(trylast=True)
 def pytest_collect_file(
     file_path,
     parent,
@@ -436,20 +1601,383 @@ def pytest_collect_file(
     if parent.config.option.markdowndocs:
         pathlib_path = pathlib.Path(str(file_path))  # pytest 7/8 compat
         if pathlib_path.suffix == ".py":
+            if not parent.config.stash[_docstring_filter_key].includes(pathlib_path):
+                return None
+            if not may_contain_fences(pathlib_path.read_bytes()):
+                # no docstring can have a fence - don't import or parse the module
+                return None
+            collection = DocstringCollection(
+                parent.config.option.markdowndocs_docstring_collection
+            )
+            if collection == DocstringCollection.ast:
+                return MarkdownDocstringFile.from_parent(parent, path=pathlib_path)
             return MarkdownDocstringCodeModule.from_parent(parent, path=pathlib_path)
-        elif pathlib_path.suffix in (".md", ".mdx", ".svx"):
+        elif pathlib_path.suffix in MARKDOWN_SUFFIXES:
+            if not parent.config.stash[_markdown_filter_key].includes(pathlib_path):
+                return None
             return MarkdownTextFile.from_parent(parent, path=pathlib_path)
 
     return None
 
 
+def _xdist_group_name(item: MarkdownInlinePythonItem) -> typing.Optional[str]:
+    mode = XdistGroup(item.config.option.markdowndocs_xdist_group)
+    assert item.parent is not None
+    if mode == XdistGroup.file:
+        return XDIST_GROUP_PREFIX + item.parent.nodeid
+    if mode == XdistGroup.chain and (
+        item.chain_root is not item or item.has_continuation
+    ):
+        # xdist only finds group names that don't contain "]"
+        return f"{XDIST_GROUP_PREFIX}{item.parent.nodeid}:{item.chain_root.start_line}"
+    return None
+
+
+def find_old_signatures(
+    changes: GitChanges,
+    node: typing.Union["MarkdownTextFile", "MarkdownDocstringFile"],
+) -> typing.Set[str]:
+    """Signatures of the fences of a file as of the git ref changes are compared to"""
+    source = changes.old_source(node.path)
+    if source is None:
+        return set()
+    config = node.config
+    markdown_it_parser = get_markdown_it_parser(config)
+    fence_syntax = FenceSyntax(config.option.markdowndocs_syntax)
+    fence_parser = FenceParser(config.option.markdowndocs_parser)
+    if isinstance(node, MarkdownTextFile):
+        fence_tests = extract_fence_tests(
+            markdown_it_parser,
+            source,
+            start_line_offset=0,
+            source_path=node.path,
+            markdown_type=node.path.suffix.replace(".", ""),
+            fence_syntax=fence_syntax,
+            fence_parser=fence_parser,
+        )
+        return set(fence_signatures(node.nodeid, fence_tests))
+
+    signatures = set()
+    signature = None
+    try:
+        object_tests = list(
+            find_object_tests_in_source(
+                source,
+                module_name_from_path(node.path),
+                node.path,
+                markdown_it_parser,
+                fence_syntax,
+                fence_parser,
+            )
+        )
+    except SyntaxError:
+        return set()
+    for object_test in object_tests:
+        signature = fence_signature(
+            f"{node.nodeid}\0{object_test.docstring_digest}",
+            signature,
+            object_test.fence_test,
+        )
+        signatures.add(signature)
+    return signatures
+
+
+def _select_changed(config: pytest.Config, items: typing.List[pytest.Item]) -> None:
+    ref = config.option.markdowndocs_changed
+    if ref is None:
+        return
+
+    is_changed: typing.Callable[[MarkdownInlinePythonItem], bool]
+    if ref:
+        changes = GitChanges(config.rootpath, ref)
+        old_signatures: typing.Dict[str, typing.Set[str]] = {}
+
+        def is_changed(item: MarkdownInlinePythonItem) -> bool:
+            if not changes.is_changed(item.path):
+                return False
+            file = item.parent
+            assert isinstance(file, (MarkdownTextFile, MarkdownDocstringFile))
+            if file.nodeid not in old_signatures:
+                old_signatures[file.nodeid] = find_old_signatures(changes, file)
+            return item.content_signature not in old_signatures[file.nodeid]
+    else:
+        manifest = config.stash.get(_manifest_key, None)
+        if manifest is None:
+            # the cacheprovider plugin is disabled
+            return
+
+        def is_changed(item: MarkdownInlinePythonItem) -> bool:
+            return item.content_signature not in manifest
+
+    selected: typing.List[pytest.Item] = []
+    deselected: typing.List[pytest.Item] = []
+    for item in items:
+        if isinstance(item, MarkdownInlinePythonItem) and not is_changed(item):
+            deselected.append(item)
+        else:
+            selected.append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+def _schedule_xdist_groups(
+    config: pytest.Config, items: typing.List[pytest.Item]
+) -> None:
+    if XdistGroup(config.option.markdowndocs_xdist_group) == XdistGroup.none:
+        return
+
+    groups: typing.Dict[str, typing.List[MarkdownInlinePythonItem]] = {}
+    slots = []
+    for index, item in enumerate(items):
+        if isinstance(item, MarkdownInlinePythonItem):
+            group_name = _xdist_group_name(item)
+            if group_name is not None and config.pluginmanager.hasplugin("xdist"):
+                item.add_marker(pytest.mark.xdist_group(group_name))
+            groups.setdefault(group_name or item.nodeid, []).append(item)
+            slots.append(index)
+
+    history = config.stash.get(_durations_key, None)
+    if history is None:
+        return
+
+    def expected_duration(group: typing.List[MarkdownInlinePythonItem]) -> float:
+        return sum(history.get(item.fence_id) or 0.0 for item in group)
+
+    # longest first, so the most expensive groups don't end up on the same worker
+    # at the end of the run (items within a group keep their order)
+    ordered = sorted(groups.values(), key=expected_duration, reverse=True)
+    for index, item in zip(slots, (item for group in ordered for item in group)):
+        items[index] = item
+
+
+@pytest.hookimpl(tryfirst=True)  # before xdist adds the group names to the node ids
+def pytest_collection_modifyitems(
+    session: pytest.Session, config: pytest.Config, items: typing.List[pytest.Item]
+) -> None:
+    _select_changed(config, items)
+    _schedule_xdist_groups(config, items)
+
+
+class _SessionRecorder:
+    """Records durations and outcomes of code fence tests in the process running the session"""
+
+    def __init__(
+        self, history: DurationHistory, manifest: ChangeManifest, node_ids: NodeIdIndex
+    ):
+        self.history = history
+        self.manifest = manifest
+        self.node_ids = node_ids
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        fence = getattr(report, "markdown_docs_fence", None)
+        if fence is None:
+            return
+        self.history.add(fence, report.when, report.duration)
+        self.node_ids.add(fence["nodeid"], fence["id"])
+        if report.failed:
+            self.manifest.failed.add(fence["signature"])
+        elif report.when == "call" and report.passed:
+            self.manifest.passed.add(fence["signature"])
+
+    def pytest_sessionfinish(self) -> None:
+        self.history.save()
+        self.manifest.save()
+        self.node_ids.save()
+
+    def pytest_terminal_summary(self, terminalreporter, config) -> None:
+        count = config.option.markdowndocs_durations
+        if count is None or not self.history.current:
+            return
+        title = "markdown-docs durations"
+        terminalreporter.write_sep("=", f"{title} (top {count})" if count else title)
+        for line in self.history.summary(count):
+            terminalreporter.write_line(line)
+
+
+class _ProfileReporter:
+    """Summarizes the profiles of code fences, in the process running the session"""
+
+    def __init__(self, profiles: ProfileSummary, directory: pathlib.Path):
+        self.profiles = profiles
+        self.directory = directory
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        fence = getattr(report, "markdown_docs_fence", None)
+        if report.when != "call" or fence is None or fence["profile"] is None:
+            return
+        profile = fence["profile"]
+        self.profiles.add(profile["path"], profile["source"], profile["line"])
+
+    def pytest_terminal_summary(self, terminalreporter, config) -> None:
+        if not self.profiles.profile_count:
+            return
+        count = config.option.markdowndocs_profile_top
+        terminalreporter.write_sep(
+            "=",
+            f"markdown-docs profile (top {count} of {self.profiles.profile_count} "
+            f"code fences, profiles in {bestrelpath(config.invocation_params.dir, self.directory)})",
+        )
+        for line in self.profiles.summary(count):
+            terminalreporter.write_line(line)
+
+
+# innermost, so the failures are renamed before --last-failed filters collected items
+@pytest.hookimpl(hookwrapper=True, trylast=True)
+def pytest_make_collect_report(collector: pytest.Collector):
+    outcome = yield
+    if not isinstance(collector, (MarkdownTextFile, MarkdownDocstringFile)):
+        return
+    node_ids = collector.config.stash.get(_node_ids_key, None)
+    lfplugin = collector.config.pluginmanager.get_plugin("lfplugin")
+    if node_ids is None or lfplugin is None or not lfplugin.lastfailed:
+        return
+    report = outcome.get_result()
+    if report.passed:
+        node_ids.update_lastfailed(lfplugin.lastfailed, report.result)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo):
+    outcome = yield
+    if isinstance(item, MarkdownInlinePythonItem):
+        assert item.parent is not None
+        # attached to the report (rather than looked up from the item), since with
+        # xdist the durations are recorded by the controller, which has no items
+        outcome.get_result().markdown_docs_fence = {
+            "id": item.fence_id,
+            "nodeid": item.nodeid,
+            "file": item.parent.nodeid,
+            "chain": item.chain_root.nodeid,
+            "fixtures": sorted(item.test_definition.fixture_names),
+            "signature": item.content_signature,
+            "profile": item.stash.get(_profile_key, None),
+        }
+
+
 def pytest_configure(config):
     config.addinivalue_line(
         "markers", f"{MARKER_NAME}: filter for pytest-markdown-docs generated tests"
     )
+    bytecode_dir = None
+    if config.option.markdowndocs_bytecode_cache and hasattr(config, "cache"):
+        bytecode_dir = config.cache.mkdir("markdown-docs-bytecode")
+    compile_cache.configure(bytecode_dir)
+
+    default_timeout = config.getini("markdown_docs_timeout")
+    if default_timeout:
+        try:
+            parse_timeout(default_timeout)
+        except Exception as e:
+            raise pytest.UsageError(f"markdown_docs_timeout: {e}")
+
+    config.stash[_markdown_filter_key] = PathFilter(
+        config.rootpath,
+        config.getini("markdown_docs_include"),
+        config.getini("markdown_docs_exclude"),
+    )
+    config.stash[_docstring_filter_key] = PathFilter(
+        config.rootpath,
+        config.getini("markdown_docs_docstring_include"),
+        config.getini("markdown_docs_docstring_exclude"),
+    )
+
+    if config.option.markdowndocs and config.option.markdowndocs_profile is not None:
+        profile_dir = config.invocation_params.dir / config.option.markdowndocs_profile
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        if not hasattr(config, "workerinput"):
+            config.pluginmanager.register(
+                _ProfileReporter(ProfileSummary(config.rootpath), profile_dir),
+                "markdown-docs-profile-reporter",
+            )
+
+    if config.option.markdowndocs and hasattr(config, "cache"):
+        history = DurationHistory(config.cache)
+        config.stash[_durations_key] = history
+        manifest = ChangeManifest(config.cache)
+        config.stash[_manifest_key] = manifest
+        node_ids = NodeIdIndex(config.cache)
+        config.stash[_node_ids_key] = node_ids
+        if not hasattr(config, "workerinput"):
+            # xdist workers send their reports to the controller, which records them
+            config.pluginmanager.register(
+                _SessionRecorder(history, manifest, node_ids),
+                "markdown-docs-session-recorder",
+            )
+
+
+def pytest_sessionstart(session: pytest.Session) -> None:
+    # imported once, so fences run by the isolated runner start out with them
+    for module_name in session.config.option.markdowndocs_preload:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            raise pytest.UsageError(f"Can't preload module {module_name!r}: {e}")
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if config.option.verbose > 0 and (
+        compile_cache.hits or compile_cache.disk_hits or compile_cache.misses
+    ):
+        terminalreporter.write_line(
+            f"markdown-docs compile cache: {compile_cache.hits} hits, "
+            f"{compile_cache.disk_hits} disk hits, {compile_cache.misses} misses"
+        )
+
+
+def _collection_jobs(value: str) -> int:
+    if value == "auto":
+        return os.cpu_count() or 1
+    return int(value)
 
 
 def pytest_addoption(parser: Parser) -> None:
+    parser.addini(
+        "markdown_docs_parallel_safe",
+        "Glob patterns (relative to the rootdir) of files with only parallel-safe "
+        "code fences",
+        type="linelist",
+        default=[],
+    )
+    parser.addini(
+        "markdown_docs_include",
+        "Glob patterns of markdown files (or directories) to collect code fences from",
+        type="linelist",
+        default=[],
+    )
+    parser.addini(
+        "markdown_docs_exclude",
+        "Glob patterns of markdown files (or directories) not to collect code fences "
+        "from",
+        type="linelist",
+        default=[],
+    )
+    parser.addini(
+        "markdown_docs_docstring_include",
+        "Glob patterns of python files (or directories) to collect code fences in "
+        "docstrings from",
+        type="linelist",
+        default=[],
+    )
+    parser.addini(
+        "markdown_docs_docstring_exclude",
+        "Glob patterns of python files (or directories) not to collect code fences in "
+        "docstrings from",
+        type="linelist",
+        default=[],
+    )
+    parser.addini(
+        "markdown_docs_prune_excluded",
+        "Don't walk directories excluded for both markdown files and docstrings, "
+        "skipping the regular tests in them too",
+        type="bool",
+        default=False,
+    )
+    parser.addini(
+        "markdown_docs_timeout",
+        "Default timeout in seconds for code fences without a timeout:SECONDS option",
+        default="",
+    )
     group = parser.getgroup("collect")
     group.addoption(
         "--markdown-docs",
@@ -466,6 +1994,149 @@ def pytest_addoption(parser: Parser) -> None:
         help="Choose an alternative fences syntax",
         dest="markdowndocs_syntax",
     )
+    group.addoption(
+        "--markdown-docs-parser",
+        action="store",
+        choices=[choice.value for choice in FenceParser],
+        default="markdown-it",
+        help="Find code fences using the (configurable) markdown-it parser, "
+        "or using a much faster scanner that only looks for code fences",
+        dest="markdowndocs_parser",
+    )
+    group.addoption(
+        "--markdown-docs-runner",
+        action="store",
+        default=None,
+        metavar="NAME",
+        help="Runner for code fences that don't specify one with runner:NAME, "
+        "e.g. 'isolated' to run each code fence in a forked process",
+        dest="markdowndocs_runner",
+    )
+    group.addoption(
+        "--markdown-docs-preload",
+        action="append",
+        default=[],
+        metavar="MODULE",
+        help="Import a module at the start of the session, so code fences run by "
+        "the isolated runner don't have to (can be repeated)",
+        dest="markdowndocs_preload",
+    )
+    group.addoption(
+        "--markdown-docs-continuation",
+        action="store",
+        choices=[choice.value for choice in ContinuationMode],
+        default="rerun",
+        help="How to run continuation blocks: re-run the whole chain for every block, "
+        "or only run the new block on top of the namespace left by the previous one",
+        dest="markdowndocs_continuation",
+    )
+    group.addoption(
+        "--markdown-docs-docstring-collection",
+        action="store",
+        choices=[choice.value for choice in DocstringCollection],
+        default="import",
+        help="Find docstrings by importing python modules, or by parsing their source "
+        "(modules are then only imported once one of their fences is run)",
+        dest="markdowndocs_docstring_collection",
+    )
+    group.addoption(
+        "--markdown-docs-collection-cache",
+        action="store_true",
+        default=False,
+        help="Cache the code fences found in unchanged markdown files (and statically "
+        "collected python modules) in the pytest cache directory",
+        dest="markdowndocs_collection_cache",
+    )
+    group.addoption(
+        "--markdown-docs-collection-jobs",
+        action="store",
+        type=_collection_jobs,
+        default=None,
+        metavar="N",
+        help="Parse markdown files ahead of collection using N worker processes "
+        "('auto' for one per CPU)",
+        dest="markdowndocs_collection_jobs",
+    )
+    group.addoption(
+        "--markdown-docs-xdist-group",
+        action="store",
+        choices=[choice.value for choice in XdistGroup],
+        default="none",
+        help="Run continuation chains (or whole files) on the same pytest-xdist worker "
+        "when using --dist=loadgroup, scheduling the slowest ones of the previous "
+        "runs first",
+        dest="markdowndocs_xdist_group",
+    )
+    group.addoption(
+        "--markdown-docs-threads",
+        action="store",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Number of threads for running parallel-safe code fences (default: "
+        "the number of CPUs + 4, up to 32)",
+        dest="markdowndocs_threads",
+    )
+    group.addoption(
+        "--markdown-docs-ids",
+        action="store",
+        choices=[choice.value for choice in FenceIds],
+        default="line",
+        help="Name code fence tests by their position and line number, or by a hash "
+        "of their content that doesn't change when other parts of the file are edited",
+        dest="markdowndocs_ids",
+    )
+    group.addoption(
+        "--markdown-docs-durations",
+        action="store",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Show the N slowest code fences (and files, continuation chains and "
+        "fixture sets), compared to previous runs (N=0 for all)",
+        dest="markdowndocs_durations",
+    )
+    group.addoption(
+        "--markdown-docs-changed",
+        action="store",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="REF",
+        help="Only run code fences that changed (including the blocks they continue "
+        "and their docstrings) since the git ref REF, or without REF, code fences "
+        "that didn't pass in a previous run",
+        dest="markdowndocs_changed",
+    )
+    group.addoption(
+        "--markdown-docs-profile",
+        action="store",
+        nargs="?",
+        const="markdown-docs-profile",
+        default=None,
+        metavar="DIR",
+        help="Profile the code fences, writing a profile per code fence to DIR "
+        "(markdown-docs-profile by default), and show the functions with the most "
+        "time spent in them across all code fences",
+        dest="markdowndocs_profile",
+    )
+    group.addoption(
+        "--markdown-docs-profile-top",
+        action="store",
+        type=int,
+        default=20,
+        metavar="N",
+        help="Number of functions shown in the --markdown-docs-profile summary",
+        dest="markdowndocs_profile_top",
+    )
+    group.addoption(
+        "--markdown-docs-bytecode-cache",
+        action="store_true",
+        default=False,
+        help="Store compiled code fences in the pytest cache directory, "
+        "so later runs don't need to compile unchanged code fences",
+        dest="markdowndocs_bytecode_cache",
+    )
 
 
 def pytest_addhooks(pluginmanager):
@@ -0,0 +1,405 @@
+import random
+
+import pytest
+from markdown_it import MarkdownIt
+
+from pytest_markdown_docs._fence_scanner import (
+    can_scan_lazily,
+    scan_fences,
+    scan_fences_lazily,
+)
+from pytest_markdown_docs.plugin import (
+    iter_markdown_it_fences,
+    iter_markdown_it_fences_streaming,
+)
+
+CORPUS = {
+    "simple": """
+# Title
+
+```python
+a = 1
+```
+""",
+    "tilde": """
+~~~python continuation
+a = 1
+~~~
+""",
+    "longer_closing": """
+````python
+```
+nested
+```
+`````
+after
+""",
+    "shorter_closing_ignored": """
+````python
+a = 1
+```
+b = 2
+````
+""",
+    "mixed_markers": """
+```python
+~~~
+a = 1
+```
+""",
+    "unclosed": """
+text
+
+```python
+a = 1
+b = 2
+""",
+    "indented_fence": """
+   ```python
+   a = 1
+  b = 2
+      c = 3
+   ```
+""",
+    "indented_code_block": """
+    ```python
+    not a fence
+    ```
+""",
+    "indented_closing_ignored": """
+```python
+a = 1
+    ```
+b = 2
+```
+""",
+    "backtick_in_info": """
+``` python `not info`
+a = 1
+```
+""",
+    "tilde_backtick_info": """
+~~~ python `fine`
+a = 1
+~~~
+""",
+    "closing_with_text": """
+```python
+a = 1
+``` not closing
+```
+""",
+    "empty": """
+```python
+```
+""",
+    "no_info": """
+```
+plain
+```
+""",
+    "blockquote": """
+> Some quote
+>
+> ```python
+> a = 1
+>b = 2
+> ```
+""",
+    "blockquote_ends_fence": """
+> ```python
+> a = 1
+not in the quote
+
+```python
+b = 2
+```
+""",
+    "list_item": """
+* A list item
+
+  ```python
+  a = 1
+  ```
+
+* Another one
+  ```python
+   b = 2
+  c = 3
+  ```
+""",
+    "ordered_list": """
+1. First
+
+   ```python
+   a = 1
+   ```
+2) Second
+""",
+    "list_ends_fence": """
+- ```python
+  a = 1
+b = 2
+```
+""",
+    "nested_list": """
+- outer
+  - inner
+
+    ```python
+    a = 1
+    ```
+""",
+    "list_then_toplevel": """
+- item
+
+```python
+a = 1
+```
+""",
+    "blockquote_in_list": """
+- > ```python
+  > a = 1
+  > ```
+""",
+    "paragraph_interrupted": """
+Some text
+```python
+a = 1
+```
+""",
+    "indented_paragraph_continuation": """
+Some text
+    ```python
+    a = 1
+    ```
+""",
+    "html_block": """
+<div>
+```python
+a = 1
+```
+</div>
+
+```python
+b = 2
+```
+""",
+    "jsx_block": """
+<Tabs>
+<Tab title="one">
+
+```python
+a = 1
+```
+
+</Tab>
+</Tabs>
+""",
+    "html_comment": """
+<!--
+```python
+a = 1
+```
+-->
+```python
+b = 2
+```
+""",
+    "html_inline_in_paragraph": """
+Text <span>inline</span>
+```python
+a = 1
+```
+""",
+    "mdx_comment": """
+{/* pmd-metadata: continuation fixture:foo */}
+```python
+a = 1
+```
+""",
+    "mdx_comment_blank_line": """
+{/* pmd-metadata: notest */}
+
+```python
+a = 1
+```
+""",
+    "mdx_comment_multiline": """
+{/* pmd-metadata:
+    continuation */}
+```python
+a = 1
+```
+""",
+    "mdx_comment_heading": """
+# {/* pmd-metadata: notest */}
+```python
+a = 1
+```
+""",
+    "mdx_comment_setext": """
+{/* pmd-metadata: notest */}
+---
+```python
+a = 1
+```
+""",
+    "mdx_comment_not_adjacent": """
+{/* pmd-metadata: notest */}
+
+***
+
+```python
+a = 1
+```
+""",
+    "mdx_comment_in_quote": """
+> {/* pmd-metadata: notest */}
+
+```python
+a = 1
+```
+""",
+    "mdx_comment_in_list": """
+- {/* pmd-metadata: notest */}
+  ```python
+  a = 1
+  ```
+""",
+    "consecutive_fences": """
+```python
+a = 1
+```
+```python continuation
+b = 2
+```
+""",
+    "thematic_break_list_like": """
+* * *
+```python
+a = 1
+```
+""",
+    "heading_closing_sequence": """
+## Heading ##
+```python
+a = 1
+```
+""",
+    "nested_blockquote_lazy": """
+>> Some text
+continued
+   > - also continued
+```python
+a = 1
+```
+""",
+    "list_lazy_indented_marker": """
+1.   text
+    * still text
+```python
+a = 1
+```
+""",
+    "html_block_in_list_ends_at_blank": """
+* <!-- comment
+
+    ```python
+    a = 1
+    ```
+""",
+    "crlf": "```python\r\na = 1\r\n```\r\n",
+    "no_trailing_newline": "```python\na = 1\n```",
+}
+
+BUILDING_BLOCKS = [
+    "Some paragraph text",
+    "",
+    "",
+    "# A heading",
+    "```python",
+    "```",
+    "~~~",
+    "````py continuation",
+    "    indented",
+    "  two spaces",
+    "- list item",
+    "1. ordered item",
+    "2. second item",
+    "> quoted",
+    ">",
+    "***",
+    "---",
+    "===",
+    "<div>",
+    "</div>",
+    "<Tab>",
+    "<!-- comment",
+    "-->",
+    "{/* pmd-metadata: continuation */}",
+    "a = 1",
+    "text",
+    "<!-- x -->",
+    "<script>",
+    "</script>",
+]
+
+PREFIXES = ["", "", "  ", "> ", ">", "- ", "* ", "1. ", " ", "   ", "    "]
+
+
+def _random_documents(count, seed=1234):
+    rng = random.Random(seed)
+    for _ in range(count):
+        lines = []
+        for _ in range(rng.randint(1, 25)):
+            # nested containers, lazy continuation lines etc.
+            prefix = "".join(rng.choice(PREFIXES) for _ in range(rng.randint(0, 3)))
+            lines.append(prefix + rng.choice(BUILDING_BLOCKS))
+        yield "\n".join(lines) + "\n"
+
+
+def _expected(markdown_string):
+    return list(
+        iter_markdown_it_fences(MarkdownIt(config="commonmark"), markdown_string)
+    )
+
+
+@pytest.mark.parametrize("name", sorted(CORPUS))
+def test_scanner_matches_markdown_it(name):
+    markdown_string = CORPUS[name]
+    assert list(scan_fences(markdown_string)) == _expected(markdown_string)
+
+
+def test_scanner_matches_markdown_it_random():
+    for markdown_string in _random_documents(500):
+        assert list(scan_fences(markdown_string)) == _expected(markdown_string), (
+            markdown_string
+        )
+
+
+def test_lazy_scanner_matches_scanner():
+    documents = list(CORPUS.values()) + list(_random_documents(200))
+    # including documents without a final line break
+    for markdown_string in documents + [document[:-1] for document in documents]:
+        buffer = markdown_string.encode("utf8")
+        if not can_scan_lazily(buffer):
+            continue
+        lazy_fences = []
+        for fence in scan_fences_lazily(buffer):
+            if fence.span is not None:
+                offset, end = fence.span
+                fence = fence._replace(
+                    content=buffer[offset:end].decode("utf8"), span=None
+                )
+            lazy_fences.append(fence)
+        assert lazy_fences == list(scan_fences(markdown_string)), markdown_string
+
+
+@pytest.mark.parametrize("chunk_size", [1, 40])
+def test_streaming_matches_markdown_it(chunk_size):
+    parser = MarkdownIt(config="commonmark")
+    for markdown_string in list(CORPUS.values()) + list(_random_documents(500)):
+        lines = markdown_string.splitlines(keepends=True)
+        fences = iter_markdown_it_fences_streaming(parser, lines, chunk_size)
+        assert list(fences) == _expected(markdown_string), markdown_string
@@ -1,8 +1,19 @@
+import hashlib
+import os
+import pathlib
 import re
+import shutil
+import subprocess
+import sys
+
+import pytest
 
 from _pytest.pytester import LineMatcher
+from markdown_it import MarkdownIt
 
 import pytest_markdown_docs  # hack: used for storing a side effect in one of the tests
+from pytest_markdown_docs import plugin
+from pytest_markdown_docs.plugin import extract_fence_tests
 
 
 def test_docstring_markdown(testdir):
@@ -102,6 +113,152 @@ def test_continuation(testdir):
     result.assert_outcomes(passed=2)
 
 
+def test_continuation_chain_blocks(testdir):
+    testdir.makefile(
+        ".md",
+        """
+        ```python
+        a = 1
+        ```
+
+        ```python continuation
+        b = a + 1
+        ```
+
+        ```python continuation
+        assert b == 3
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*_ [[]CodeFence#3[]][[]line:9[]] _*",
+            "Error in code block:",
+            "*```",
+            "10   assert b == 3",
+            "*```",
+            '*File "*.md", line 10, in <module>',
+        ]
+    )
+
+    tests = list(
+        extract_fence_tests(
+            MarkdownIt(),
+            "```python\na = 1\n```\n\n```python continuation\nb = 2\n```\n",
+            0,
+            pathlib.Path("test.md"),
+        )
+    )
+    # the blocks are stored once, and sources are only built on demand
+    assert tests[0].blocks is tests[1].blocks
+    assert tests[1].chain == tests[0].blocks
+    assert tests[1].source == "\na = 1\n\n\n\nb = 2\n"
+    assert tests[0].source == "\na = 1\n"
+
+
+def test_continuation_incremental(testdir):
+    testdir.makepyfile(
+        conftest="""
+executions = []
+"""
+    )
+    testdir.makefile(
+        ".md",
+        """
+        ```python
+        import conftest
+        conftest.executions.append("first")
+        b = "hello"
+        ```
+
+        ```python continuation
+        conftest.executions.append("second")
+        assert b + " world" == "hello world"
+        ```
+
+        ```python continuation
+        conftest.executions.append("third")
+        assert conftest.executions == ["first", "second", "third"]
+        ```
+    """,
+    )
+    result = testdir.runpytest(
+        "--markdown-docs", "--markdown-docs-continuation=incremental"
+    )
+    result.assert_outcomes(passed=3)
+
+
+def test_continuation_retry(testdir):
+    testdir.makepyfile(
+        conftest="""
+attempts = 0
+"""
+    )
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+x = 1
+```
+
+```python continuation retry:1
+import conftest
+x += 1
+conftest.attempts += 1
+assert conftest.attempts > 1
+```
+
+```python continuation
+# the failed attempt's changes don't leak into the retry, or the chain
+assert x == 2
+```
+""",
+    )
+    for continuation in ("rerun", "incremental"):
+        result = testdir.runpytest(
+            "--markdown-docs",
+            f"--markdown-docs-continuation={continuation}",
+            "-p",
+            "no:cacheprovider",
+        )
+        result.assert_outcomes(passed=3)
+
+
+def test_continuation_incremental_falls_back_to_rerun(testdir):
+    testdir.makepyfile(
+        conftest="""
+executions = []
+"""
+    )
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+import conftest
+conftest.executions.append("first")
+```
+
+```python continuation
+conftest.executions.append("second")
+```
+
+```python continuation
+conftest.executions.append("third")
+# the second block was deselected, so the chain is re-run from the start
+assert conftest.executions == ["first", "first", "second", "third"]
+```
+""",
+    )
+    result = testdir.runpytest(
+        "--markdown-docs",
+        "--markdown-docs-continuation=incremental",
+        "--deselect=test_file.md::[CodeFence#2][line:6]",
+    )
+    result.assert_outcomes(passed=2, deselected=1)
+
+
 def test_traceback(testdir):
     testdir.makefile(
         ".md",
@@ -229,6 +386,93 @@ def foo():
     result.assert_outcomes(errors=1)
 
 
+def test_cached_globals(testdir):
+    testdir.makeconftest(
+        """
+        import pathlib
+        import pytest
+
+        @pytest.fixture
+        def name():
+            return "fixture"
+
+        def log(line):
+            with pathlib.Path("calls.log").open("a") as f:
+                f.write(line + "\\n")
+
+        def pytest_markdown_docs_session_globals():
+            log("session")
+            return {"dataset": [1, 2, 3], "name": "session"}
+
+        def pytest_markdown_docs_file_globals(path):
+            log(f"file {path.name}")
+            return {"name": path.stem}
+
+        def pytest_markdown_docs_globals():
+            return {"per_fence": True}
+    """
+    )
+    testdir.makefile(
+        ".md",
+        first="""
+        ```python
+        assert dataset == [1, 2, 3]
+        assert name == "first"
+        assert per_fence
+        assert len(dataset) == 3
+        dataset = None
+        ```
+
+        ```python
+        # the previous fence only replaced its own global
+        assert dataset == [1, 2, 3]
+        ```
+    """,
+        second="""
+        ```python
+        assert name == "second"
+        ```
+
+        ```python fixture:name
+        assert name == "fixture"
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=4)
+    calls = (testdir.tmpdir / "calls.log").read().splitlines()
+    assert calls == ["session", "file first.md", "file second.md"]
+
+
+def test_cached_globals_with_patched_builtins(testdir):
+    testdir.makeconftest(
+        """
+        import pytest
+
+        @pytest.fixture
+        def patched_input(monkeypatch):
+            monkeypatch.setattr("builtins.input", lambda prompt="": "patched")
+
+        def pytest_markdown_docs_file_globals(path):
+            return {"answer": 42}
+    """
+    )
+    testdir.makefile(
+        ".md",
+        """
+        ```python
+        assert answer == 42
+        ```
+
+        ```python fixture:patched_input
+        assert input() == "patched"
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2)
+
+
 def test_fixture_overriding_global(testdir):
     testdir.makeconftest(
         """
@@ -354,142 +598,884 @@ def test_notest_mdx_comment(testdir):
     result.assert_outcomes(passed=0)
 
 
-def test_superfences_format_markdown(testdir):
-    testdir.makefile(
+def test_collection_cache(testdir):
+    testdir.makeconftest(
+        """
+        import pathlib
+        import markdown_it
+
+        class CountingMarkdownIt(markdown_it.MarkdownIt):
+            def parse(self, src, env=None):
+                with pathlib.Path("parses.log").open("a") as f:
+                    f.write("parse\\n")
+                return super().parse(src, env)
+
+        def pytest_markdown_docs_markdown_it():
+            return CountingMarkdownIt(config="commonmark")
+    """
+    )
+    md_file = testdir.makefile(
         ".md",
         """
         ```python
         b = "hello"
         ```
 
-        ```{.python continuation}
-        assert b + " world" == "hello world"
-        ```
-
-        # the lang may not be the first element
-        ```{other_option .python .other-class continuation}
+        ```python continuation
         assert b + " world" == "hello world"
         ```
     """,
     )
-    result = testdir.runpytest("--markdown-docs", "--markdown-docs-syntax=superfences")
-    result.assert_outcomes(passed=3)
+    log = testdir.tmpdir / "parses.log"
 
+    def run():
+        result = testdir.runpytest(
+            "--markdown-docs", "--markdown-docs-collection-cache"
+        )
+        result.assert_outcomes(passed=2)
+        return len(log.readlines())
 
-def test_superfences_format_docstring(testdir):
-    testdir.makepyfile(
-        """
-        def simple():
-            \"\"\"
-            ```python
-            b = "hello"
-            ```
-
-            ```{.python continuation}
-            assert b + " world" == "hello world"
-            ```
-            \"\"\"
-        """
-    )
-    result = testdir.runpytest("--markdown-docs", "--markdown-docs-syntax=superfences")
-    result.assert_outcomes(passed=2)
+    assert run() == 1
+    assert run() == 1  # unchanged file isn't parsed again
 
+    os.utime(md_file, ns=(0, 0))
+    assert run() == 1  # same content, different mtime
 
-def test_error_origin_after_docstring_traceback(testdir, support_dir):
-    sample_file = support_dir / "docstring_error_after.py"
-    testdir.makepyfile(**{sample_file.stem: sample_file.read_text()})
-    result = testdir.runpytest("-v", "--markdown-docs")
+    md_file.write(md_file.read() + "\n```python\nassert True\n```\n")
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-collection-cache")
+    result.assert_outcomes(passed=3)
+    assert len(log.readlines()) == 2
 
-    data: LineMatcher = result.stdout
-    data.re_match_lines(
-        [
-            r"Traceback \(most recent call last\):",
-            r'\s*File ".*/docstring_error_after.py", line 5, in <module>',
-            r"\s*docstring_error_after.error_after\(\)",
-            r'\s*File ".*/docstring_error_after.py", line 11, in error_after',
-            r'\s*raise Exception\("bar"\)',
-            r"\s*Exception: bar",
-        ],
-        consecutive=True,
-    )
 
+def test_markdown_it_parser_reused(testdir):
+    testdir.makeconftest(
+        """
+        import pathlib
+        import markdown_it
 
-def test_error_origin_before_docstring_traceback(testdir, support_dir):
-    sample_file = support_dir / "docstring_error_before.py"
-    testdir.makepyfile(**{sample_file.stem: sample_file.read_text()})
-    result = testdir.runpytest("-v", "--markdown-docs")
+        class CountingMarkdownIt(markdown_it.MarkdownIt):
+            def parse(self, src, env=None):
+                with pathlib.Path("calls.log").open("a") as f:
+                    f.write("parse\\n")
+                return super().parse(src, env)
 
-    data: LineMatcher = result.stdout
-    data.re_match_lines(
-        [
-            r"Traceback \(most recent call last\):",
-            r'\s*File ".*/docstring_error_before.py", line 9, in <module>',
-            r"\s*docstring_error_before.error_before\(\)",
-            r'\s*File ".*/docstring_error_before.py", line 2, in error_before',
-            r'\s*raise Exception\("foo"\)',
-            r"\s*Exception: foo",
-        ],
-        consecutive=True,
+        def pytest_markdown_docs_markdown_it():
+            with pathlib.Path("calls.log").open("a") as f:
+                f.write("hook\\n")
+            return CountingMarkdownIt(config="commonmark")
+    """
     )
+    testdir.makepyfile(
+        """
+        def no_fences():
+            \"\"\"Just a docstring, with some `inline code`\"\"\"
 
+        def with_fence():
+            \"\"\"
+            ```python
+            assert True
+            ```
+            \"\"\"
 
-def test_custom_runner(testdir):
-    testdir.makeconftest(
-        """
-        import pytest_markdown_docs._runners
-        
-        @pytest_markdown_docs._runners.register_runner()
-        class LinesAreAllFoo(pytest_markdown_docs._runners.DefaultRunner):
-            def runtest(self, test, args):
-                lines = test.source.strip().split("\\n")
-                for line in lines:
-                    assert line == "foo"
+        class NoFences:
+            \"\"\"Another docstring\"\"\"
     """
     )
     testdir.makefile(
         ".md",
         """
-        ```python runner:LinesAreAllFoo
-        foo
-        foo
-        ```
-        
-        ```python runner:LinesAreAllFoo
-        foo
-        bar
+        ```python
+        assert True
         ```
     """,
     )
-
-    result = testdir.runpytest("-v", "--markdown-docs")
-    result.assert_outcomes(passed=1, failed=1)
-    result.stdout.re_match_lines(
-        [
-            r".*\[CodeFence#1\]\[line:1\].*PASSED.*",
-            r".*\[CodeFence#2\]\[line:6\].*FAILED.*",
-        ],
-        consecutive=True,
-    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2)
+    calls = (testdir.tmpdir / "calls.log").read().split()
+    assert calls == ["hook", "parse", "parse"]
 
 
-def test_admonition_markdown_text_file(testdir):
+def test_collection_jobs(testdir):
     testdir.makeconftest(
         """
-        def pytest_markdown_docs_globals():
-            return {"a": "hello"}
+        import os
+        import pathlib
+        import markdown_it
 
-        def pytest_markdown_docs_markdown_it():
-            import markdown_it
-            from mdit_py_plugins.admon import admon_plugin
+        class LoggingMarkdownIt(markdown_it.MarkdownIt):
+            def parse(self, src, env=None):
+                with pathlib.Path("parses.log").open("a") as f:
+                    f.write(f"{os.getpid()}\\n")
+                return super().parse(src, env)
 
-            mi = markdown_it.MarkdownIt(config="commonmark")
-            mi.use(admon_plugin)
-            return mi
+        def pytest_markdown_docs_markdown_it():
+            return LoggingMarkdownIt(config="commonmark")
     """
     )
+    for name in ("first", "second", "third"):
+        testdir.makefile(
+            ".md",
+            **{
+                name: """
+```python
+assert True
+```
 
-    testdir.makefile(
-        ".md",
+```python continuation
+assert False
+```
+"""
+            },
+        )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-collection-jobs=2")
+    result.assert_outcomes(passed=3, failed=3)
+    result.stdout.fnmatch_lines(["*second.md::[[]CodeFence#2[]][[]line:5[]]*"])
+    parse_pids = (testdir.tmpdir / "parses.log").read().split()
+    assert len(parse_pids) == 3
+    assert str(os.getpid()) not in parse_pids
+
+
+def test_collection_jobs_xdist(testdir):
+    pytest.importorskip("xdist")
+    testdir.makeconftest(
+        """
+        import os
+        import pathlib
+        from pytest_markdown_docs import plugin
+
+        if "PYTEST_XDIST_WORKER" in os.environ:
+            os.cpu_count = lambda: 8
+
+        def preparse_markdown_files(config, jobs):
+            worker = os.environ.get("PYTEST_XDIST_WORKER", "controller")
+            with pathlib.Path("preparse.log").open("a") as f:
+                f.write(f"{worker} {jobs}\\n")
+
+        plugin.preparse_markdown_files = preparse_markdown_files
+    """
+    )
+    testdir.makefile(".md", test_file="```python\nassert True\n```\n")
+    result = testdir.runpytest(
+        "--markdown-docs", "--markdown-docs-collection-jobs=8", "-n", "2"
+    )
+    result.assert_outcomes(passed=1)
+    # only the workers pre-parse, sharing the CPUs between them
+    calls = sorted((testdir.tmpdir / "preparse.log").read().splitlines())
+    assert calls == ["gw0 4", "gw1 4"]
+
+
+def test_xdist_group_chain(testdir):
+    pytest.importorskip("xdist")
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+import os, pathlib
+with pathlib.Path("workers.log").open("a") as f:
+    f.write(f"chain {os.environ['PYTEST_XDIST_WORKER']}\\n")
+```
+
+```python continuation
+assert True
+```
+
+```python continuation
+assert True
+```
+
+```python
+assert True
+```
+""",
+    )
+    result = testdir.runpytest(
+        "--markdown-docs",
+        "--markdown-docs-xdist-group=chain",
+        "-n",
+        "3",
+        "--dist=loadgroup",
+    )
+    result.assert_outcomes(passed=4)
+    # every block of the chain re-runs the first one, always on the same worker
+    workers = (testdir.tmpdir / "workers.log").read().splitlines()
+    assert len(workers) == 3
+    assert len(set(workers)) == 1
+
+
+def test_xdist_group_orders_longest_first(testdir):
+    testdir.makefile(
+        ".md",
+        fast="""
+```python
+assert True
+```
+""",
+        slow="""
+```python
+import time
+time.sleep(0.2)
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2)
+    result = testdir.runpytest(
+        "--markdown-docs", "--markdown-docs-xdist-group=file", "--collect-only", "-q"
+    )
+    result.stdout.fnmatch_lines(
+        ["slow.md::[[]CodeFence#1[]]*", "fast.md::[[]CodeFence#1[]]*"]
+    )
+
+
+def test_durations_report(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python fixture:tmp_path
+import time
+time.sleep(0.01)
+```
+
+```python continuation
+assert True
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-durations=5")
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines(
+        [
+            "*= markdown-docs durations (top 5) =*",
+            "slowest code fences:",
+            "*s (new) test_file.md::[[]CodeFence#*[]] (setup *s, call *s, teardown *s)",
+            "*",
+            "slowest files:",
+            "*s (new) test_file.md (2 code fences)",
+            "slowest continuation chains:",
+            "*s (new) test_file.md::[[]CodeFence#1[]][[]line:1[]] (2 code fences)",
+            "slowest fixture sets:",
+        ]
+    )
+
+    # moving the fences around doesn't lose their history
+    testdir.makefile(
+        ".md",
+        test_file="""
+# Title
+
+```python fixture:tmp_path
+import time
+time.sleep(0.01)
+```
+
+```python continuation
+assert True
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-durations=1")
+    result.stdout.fnmatch_lines(
+        [
+            "slowest code fences:",
+            "*s (*% vs *s) test_file.md::[[]CodeFence#*[]][[]line:*[]] (*)",
+            "slowest files:",
+        ]
+    )
+
+
+def test_last_failed_across_line_shifts(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+assert True
+```
+
+```python
+assert False
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=1, failed=1)
+
+    testdir.makefile(
+        ".md",
+        test_file="""
+# Some new text above the fences
+
+```python
+assert True
+```
+
+```python
+assert False
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "--lf", "-v")
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "run-last-failure: rerun previous 1 failure",
+            "*test_file.md::[[]CodeFence#2[]][[]line:7[]] FAILED*",
+        ]
+    )
+
+
+def test_content_ids(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+a = 1
+```
+
+```python continuation
+assert a == 1
+```
+
+```python
+a = 1
+```
+""",
+    )
+    testdir.makepyfile(
+        test_docstrings='''
+def foo():
+    """
+    ```python
+    a = 1
+    ```
+    """
+''',
+    )
+    result = testdir.runpytest(
+        "--markdown-docs", "--markdown-docs-ids=content", "--collect-only", "-q"
+    )
+    digest = hashlib.sha256(b"a = 1\n").hexdigest()[:12]
+    result.stdout.fnmatch_lines(
+        [
+            f"test_docstrings.py::foo[[]CodeFence:{digest}[]]",
+            f"test_file.md::[[]CodeFence:{digest}[]]",
+            "test_file.md::[[]CodeFence:*+1[]]",
+            f"test_file.md::[[]CodeFence:{digest}#2[]]",
+        ]
+    )
+
+
+def test_changed_since_last_run(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+a = 1
+```
+
+```python continuation
+assert a == 1
+```
+
+```python
+assert False
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2, failed=1)
+
+    # only the failed fence runs again
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-changed")
+    result.assert_outcomes(failed=1, deselected=2)
+
+    # changing a fence also selects its continuation blocks
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+a = 2
+```
+
+```python continuation
+assert a == 2
+```
+
+```python
+assert True
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-changed", "-v")
+    result.assert_outcomes(passed=3)
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-changed")
+    result.assert_outcomes(deselected=3)
+
+
+def test_changed_since_git_ref(testdir):
+    if shutil.which("git") is None:
+        pytest.skip("git is not available")
+
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+            cwd=testdir.tmpdir,
+            check=True,
+            capture_output=True,
+        )
+
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+a = 1
+```
+
+```python
+assert True
+```
+""",
+    )
+    testdir.makepyfile(
+        test_docstrings='''
+def foo():
+    """
+    ```python
+    assert True
+    ```
+    """
+''',
+    )
+    git("init", "-q")
+    git("add", "-A")
+    git("commit", "-q", "-m", "initial")
+
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-changed=HEAD")
+    result.assert_outcomes(deselected=3)
+
+    testdir.makefile(
+        ".md",
+        test_file="""
+# Moved around
+
+```python
+assert True
+```
+
+```python
+a = 2
+```
+""",
+    )
+    testdir.makefile(".md", new_file="```python\nassert True\n```\n")
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-changed=HEAD", "-v")
+    result.assert_outcomes(passed=2, deselected=2)
+    result.stdout.fnmatch_lines(
+        [
+            "*new_file.md::[[]CodeFence#1[]][[]line:1[]] PASSED*",
+            "*test_file.md::[[]CodeFence#2[]][[]line:7[]] PASSED*",
+        ]
+    )
+
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-changed=nope")
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+
+
+def test_superfences_format_markdown(testdir):
+    testdir.makefile(
+        ".md",
+        """
+        ```python
+        b = "hello"
+        ```
+
+        ```{.python continuation}
+        assert b + " world" == "hello world"
+        ```
+
+        # the lang may not be the first element
+        ```{other_option .python .other-class continuation}
+        assert b + " world" == "hello world"
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-syntax=superfences")
+    result.assert_outcomes(passed=3)
+
+
+def test_superfences_format_docstring(testdir):
+    testdir.makepyfile(
+        """
+        def simple():
+            \"\"\"
+            ```python
+            b = "hello"
+            ```
+
+            ```{.python continuation}
+            assert b + " world" == "hello world"
+            ```
+            \"\"\"
+        """
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-syntax=superfences")
+    result.assert_outcomes(passed=2)
+
+
+def test_error_origin_after_docstring_traceback(testdir, support_dir):
+    sample_file = support_dir / "docstring_error_after.py"
+    testdir.makepyfile(**{sample_file.stem: sample_file.read_text()})
+    result = testdir.runpytest("-v", "--markdown-docs")
+
+    data: LineMatcher = result.stdout
+    data.re_match_lines(
+        [
+            r"Traceback \(most recent call last\):",
+            r'\s*File ".*/docstring_error_after.py", line 5, in <module>',
+            r"\s*docstring_error_after.error_after\(\)",
+            r'\s*File ".*/docstring_error_after.py", line 11, in error_after',
+            r'\s*raise Exception\("bar"\)',
+            r"\s*Exception: bar",
+        ],
+        consecutive=True,
+    )
+
+
+def test_error_origin_before_docstring_traceback(testdir, support_dir):
+    sample_file = support_dir / "docstring_error_before.py"
+    testdir.makepyfile(**{sample_file.stem: sample_file.read_text()})
+    result = testdir.runpytest("-v", "--markdown-docs")
+
+    data: LineMatcher = result.stdout
+    data.re_match_lines(
+        [
+            r"Traceback \(most recent call last\):",
+            r'\s*File ".*/docstring_error_before.py", line 9, in <module>',
+            r"\s*docstring_error_before.error_before\(\)",
+            r'\s*File ".*/docstring_error_before.py", line 2, in error_before',
+            r'\s*raise Exception\("foo"\)',
+            r"\s*Exception: foo",
+        ],
+        consecutive=True,
+    )
+
+
+def test_docstring_ast_collection(testdir):
+    testdir.makepyfile(
+        test_module="""
+\"\"\"
+```python
+import pytest_markdown_docs
+assert pytest_markdown_docs.imported_test_module
+```
+\"\"\"
+import pytest_markdown_docs
+
+pytest_markdown_docs.imported_test_module = True
+
+
+class Parent:
+    def method(self):
+        \"\"\"Summary line
+
+        ```python
+        assert False
+        ```
+        \"\"\"
+"""
+    )
+    result = testdir.runpytest(
+        "-v", "--markdown-docs", "--markdown-docs-docstring-collection=ast"
+    )
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.re_match_lines(
+        [
+            r".*test_module\[CodeFence#1\]\[line:2\].*PASSED.*",
+            r".*Parent.*method\[CodeFence#1\]\[line:16\].*FAILED.*",
+        ]
+    )
+    result.stdout.re_match_lines([r'\s*File ".*/test_module.py", line 17, in <module>'])
+
+
+def test_docstring_ast_collection_does_not_import(testdir):
+    testdir.makepyfile(
+        mymodule="""
+raise Exception("should not be imported")
+
+def func():
+    \"\"\"
+    ```python
+    assert True
+    ```
+    \"\"\"
+"""
+    )
+    result = testdir.runpytest(
+        "--collect-only",
+        "--markdown-docs",
+        "--markdown-docs-docstring-collection=ast",
+    )
+    result.stdout.fnmatch_lines(["*func[[]CodeFence#1[]][[]line:5[]]*"])
+    assert "should not be imported" not in result.stdout.str()
+
+
+def test_docstring_collection_does_not_evaluate_attributes(testdir):
+    testdir.makepyfile(
+        mymodule="""
+import functools
+
+def deco(f):
+    @functools.wraps(f)
+    def wrapper(*args):
+        return f(*args)
+    return wrapper
+
+class Base:
+    @property
+    def prop(self):
+        raise Exception("property evaluated")
+
+    def method(self):
+        \"\"\"Summary
+
+        ```python
+        assert False
+        ```
+        \"\"\"
+
+class Child(Base):
+    def method(self):
+        pass
+
+@deco
+def decorated():
+    \"\"\"
+    ```python
+    assert True
+    ```
+    \"\"\"
+
+def __getattr__(name):
+    if name == "lazy":
+        raise Exception("lazy attribute evaluated")
+    raise AttributeError(name)
+
+def __dir__():
+    return [*globals(), "lazy"]
+"""
+    )
+    result = testdir.runpytest("--markdown-docs")
+    # the inherited docstring is only tested once, for the class defining it
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*_ Base.method[[]CodeFence#1[]][[]line:17[]] _*",
+            '*File "*mymodule.py", line 18, in <module>',
+        ]
+    )
+    assert "evaluated" not in result.stdout.str()
+
+
+def test_docstring_collection_skips_and_reuses_modules(testdir):
+    testdir.mkdir("sub")
+    testdir.makepyfile(
+        **{
+            "sub/test_mod": """
+import pathlib
+
+with pathlib.Path("imports.log").open("a") as f:
+    f.write("import\\n")
+
+def test_something():
+    \"\"\"
+    ```python
+    assert True
+    ```
+    \"\"\"
+""",
+            # without any fence markers, modules aren't imported
+            "sub/no_fences": "raise Exception('imported')",
+        }
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2)
+    # the test module imported by pytest is reused
+    assert (testdir.tmpdir / "imports.log").read() == "import\n"
+
+
+def test_error_origin_docstring_ast_collection(testdir, support_dir):
+    sample_file = support_dir / "docstring_error_after.py"
+    testdir.makepyfile(**{sample_file.stem: sample_file.read_text()})
+    result = testdir.runpytest(
+        "-v", "--markdown-docs", "--markdown-docs-docstring-collection=ast"
+    )
+
+    data: LineMatcher = result.stdout
+    data.re_match_lines(
+        [
+            r"Traceback \(most recent call last\):",
+            r'\s*File ".*/docstring_error_after.py", line 5, in <module>',
+            r"\s*docstring_error_after.error_after\(\)",
+            r'\s*File ".*/docstring_error_after.py", line 11, in error_after',
+            r'\s*raise Exception\("bar"\)',
+            r"\s*Exception: bar",
+        ],
+        consecutive=True,
+    )
+
+
+def test_custom_runner(testdir):
+    testdir.makeconftest(
+        """
+        import pytest_markdown_docs._runners
+        
+        @pytest_markdown_docs._runners.register_runner()
+        class LinesAreAllFoo(pytest_markdown_docs._runners.DefaultRunner):
+            def runtest(self, test, args):
+                lines = test.source.strip().split("\\n")
+                for line in lines:
+                    assert line == "foo"
+    """
+    )
+    testdir.makefile(
+        ".md",
+        """
+        ```python runner:LinesAreAllFoo
+        foo
+        foo
+        ```
+        
+        ```python runner:LinesAreAllFoo
+        foo
+        bar
+        ```
+    """,
+    )
+
+    result = testdir.runpytest("-v", "--markdown-docs")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.re_match_lines(
+        [
+            r".*\[CodeFence#1\]\[line:1\].*PASSED.*",
+            r".*\[CodeFence#2\]\[line:6\].*FAILED.*",
+        ],
+        consecutive=True,
+    )
+
+
+def test_fence_raising_type_error_runs_once(testdir):
+    testdir.makefile(
+        ".md",
+        """
+        ```python
+        print("-".join(["fence", "ran"]))
+        raise TypeError("from the fence")
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(failed=1)
+    assert result.stdout.str().count("fence-ran") == 1
+
+
+def test_isolated_runner(testdir):
+    testdir.makepyfile(heavymodule="")
+    testdir.syspathinsert()
+    testdir.makefile(
+        ".md",
+        """
+        ```python runner:isolated
+        import sys
+        import pytest_markdown_docs
+        assert "heavymodule" in sys.modules
+        pytest_markdown_docs.leaked = True
+        ```
+
+        ```python
+        import pytest_markdown_docs
+        assert not hasattr(pytest_markdown_docs, "leaked")
+        ```
+
+        ```python runner:isolated
+        def foo():
+            raise Exception("doh")
+
+        foo()
+        ```
+
+        ```python runner:isolated
+        import pytest
+        pytest.skip("not today")
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-preload=heavymodule")
+    result.assert_outcomes(passed=2, failed=1, skipped=1)
+    result.stdout.fnmatch_lines(
+        [
+            "Error in code block:",
+            "*```",
+            "*def foo():",
+            "*",
+            "*",
+            "*foo()",
+            "*```",
+            "Traceback (most recent call last):",
+            '  File "*test_isolated_runner.md", line 17, in <module>',
+            "    foo()",
+            '  File "*test_isolated_runner.md", line 15, in foo',
+            '    raise Exception("doh")',
+            "Exception: doh",
+        ]
+    )
+
+
+def test_isolated_runner_session_default(testdir):
+    testdir.makefile(
+        ".md",
+        """
+        ```python
+        import os
+        os.environ["LEAKED"] = "1"
+        a = 1
+        ```
+
+        ```python continuation
+        assert a == 1
+        ```
+
+        ```python
+        import os
+        assert "LEAKED" not in os.environ
+        ```
+    """,
+    )
+    for continuation in ("rerun", "incremental"):
+        result = testdir.runpytest(
+            "--markdown-docs",
+            "--markdown-docs-runner=isolated",
+            f"--markdown-docs-continuation={continuation}",
+        )
+        result.assert_outcomes(passed=3)
+
+
+def test_admonition_markdown_text_file(testdir):
+    testdir.makeconftest(
+        """
+        def pytest_markdown_docs_globals():
+            return {"a": "hello"}
+
+        def pytest_markdown_docs_markdown_it():
+            import markdown_it
+            from mdit_py_plugins.admon import admon_plugin
+
+            mi = markdown_it.MarkdownIt(config="commonmark")
+            mi.use(admon_plugin)
+            return mi
+    """
+    )
+
+    testdir.makefile(
+        ".md",
         """
         ??? quote
 
@@ -616,6 +1602,175 @@ assert conftest.attempt_counter[key] >= 2
     result.assert_outcomes(passed=2)
 
 
+def test_retry_compiles_once(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python retry:2
+assert False  # Always fails
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "-v")
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(
+        ["markdown-docs compile cache: 2 hits, 0 disk hits, 1 misses"]
+    )
+
+
+def test_bytecode_cache(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+assert True
+```
+""",
+    )
+    result = testdir.runpytest(
+        "--markdown-docs", "--markdown-docs-bytecode-cache", "-v"
+    )
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(
+        ["markdown-docs compile cache: 0 hits, 0 disk hits, 1 misses"]
+    )
+    result = testdir.runpytest(
+        "--markdown-docs", "--markdown-docs-bytecode-cache", "-v"
+    )
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(
+        ["markdown-docs compile cache: 0 hits, 1 disk hits, 0 misses"]
+    )
+
+
+def test_bytecode_cache_optimization_level(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python
+assert False
+```
+""",
+    )
+    args = ("-m", "pytest", "--markdown-docs", "--markdown-docs-bytecode-cache", "-v")
+    # asserts are stripped under -O, which must not leak into regular runs
+    result = testdir.run(sys.executable, "-O", *args)
+    result.assert_outcomes(passed=1)
+    result = testdir.run(sys.executable, *args)
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(
+        ["markdown-docs compile cache: 0 hits, 0 disk hits, 1 misses"]
+    )
+
+
+def test_fast_parser(testdir):
+    testdir.makefile(
+        ".mdx",
+        """
+        > ```python
+        > b = "hello"
+        > ```
+
+        {/* pmd-metadata: continuation */}
+        ```python
+        assert b + " world" == "hello world"
+        ```
+
+        - ```python
+          assert False
+          ```
+
+        {/* pmd-metadata: notest */}
+        ```python
+        assert False
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-parser=fast")
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(["*[[]CodeFence#3[]][[]line:10[]]*"])
+
+
+def test_streaming_extraction(testdir, monkeypatch):
+    monkeypatch.setattr(plugin, "LARGE_FILE_MIN_SIZE", 0)
+    monkeypatch.setattr(plugin, "STREAMING_CHUNK_SIZE", 1)
+    testdir.makefile(
+        ".mdx",
+        """
+        ```python
+        a = 1
+        ```
+
+        Some text
+
+        {/* pmd-metadata: continuation */}
+
+        ```python
+        b = a + 1
+        ```
+
+        ```python continuation
+        assert b == 3
+        ```
+    """,
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*_ [[]CodeFence#3[]][[]line:13[]] _*",
+            '*File "*.mdx", line 14, in <module>',
+        ]
+    )
+
+
+def test_lazy_fence_sources(testdir, monkeypatch):
+    monkeypatch.setattr(plugin, "LARGE_FILE_MIN_SIZE", 0)
+    testdir.makefile(
+        ".md",
+        """
+        ```python
+        a = "héllo"
+        ```
+
+        > ```python continuation
+        > assert a == "héllo"
+        > ```
+
+        ```python continuation
+        assert a == "héllo"
+        b = 1
+        assert b == 2
+        ```
+    """,
+    )
+    path = pathlib.Path(str(testdir.tmpdir)) / "test_lazy_fence_sources.md"
+    tests = plugin.extract_fence_tests_from_file(
+        MarkdownIt(),
+        path,
+        "md",
+        plugin.FenceSyntax.default,
+        plugin.FenceParser.fast,
+    )
+    # fences outside of containers are read from the file when needed
+    assert [block.text for block in tests[0].blocks] == [
+        None,
+        'assert a == "héllo"\n',
+        None,
+    ]
+    assert tests[2].block_content == 'assert a == "héllo"\nb = 1\nassert b == 2\n'
+
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-parser=fast")
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*_ [[]CodeFence#3[]][[]line:9[]] _*",
+            "12   assert b == 2",
+            '*File "*.md", line 12, in <module>',
+        ]
+    )
+
+
 def test_retry_invalid_negative(testdir):
     """Test that negative retry counts raise an error."""
     testdir.makefile(
@@ -720,7 +1875,73 @@ def my_function():
 """
     )
     result = testdir.runpytest("--markdown-docs")
-    result.assert_outcomes(passed=1)
+    result.assert_outcomes(passed=1)
+
+
+def test_timeout(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python timeout:0.2
+import time
+while True:
+    time.sleep(0.01)
+```
+
+```python timeout:5
+assert True
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*FenceTimeout: Code fence timed out after 0.2s while at line 4 of *test_file.md",
+        ]
+    )
+
+
+def test_timeout_ini_default(testdir):
+    testdir.makeini("[pytest]\nmarkdown_docs_timeout = 0.2\n")
+    testdir.makefile(
+        ".mdx",
+        test_file="""
+```python
+while True:
+    pass
+```
+
+{/* pmd-metadata: timeout:5 */}
+```python
+import time
+time.sleep(0.3)
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        ["*timed out after 0.2s while at line * of *test_file.mdx"]
+    )
+
+
+def test_timeout_invalid(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python timeout:0
+assert True
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(errors=1)
+    result.stdout.fnmatch_lines(["*Invalid timeout '0'*positive number of seconds*"])
+
+    testdir.makeini("[pytest]\nmarkdown_docs_timeout = soon\n")
+    result = testdir.runpytest("--markdown-docs")
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
 
 
 # ============================================================================
@@ -1089,6 +2310,304 @@ assert loop_id == id(asyncio.get_running_loop())
     result.assert_outcomes(passed=1)
 
 
+def test_timeout_async(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python timeout:0.2
+import asyncio
+await asyncio.sleep(10)
+```
+
+```python timeout:0.2
+import time
+async def blocking():
+    while True:
+        time.sleep(0.01)
+await blocking()
+```
+
+```python
+import asyncio
+await asyncio.sleep(0)
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=1, failed=2)
+    result.stdout.fnmatch_lines(
+        [
+            "*FenceTimeout: Code fence timed out after 0.2s while at line 3 of *",
+            "*FenceTimeout: Code fence timed out after 0.2s while at line 10 of *",
+        ]
+    )
+
+
+def test_concurrent_async_fences(testdir):
+    testdir.makeconftest(
+        """
+events = {}
+"""
+    )
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python concurrent timeout:5
+import asyncio, conftest
+event = conftest.events.setdefault("ping", asyncio.Event())
+await event.wait()
+conftest.events.setdefault("pong", asyncio.Event()).set()
+```
+
+```python concurrent
+import asyncio, conftest
+conftest.events.setdefault("ping", asyncio.Event()).set()
+await conftest.events.setdefault("pong", asyncio.Event()).wait()
+assert "event" not in globals()
+```
+
+```python concurrent
+import asyncio
+await asyncio.sleep(0)
+assert False
+```
+
+```python concurrent
+# not async, so it runs on its own
+assert True
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "-v")
+    result.assert_outcomes(passed=3, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*[[]CodeFence#1[]]* PASSED*",
+            "*[[]CodeFence#2[]]* PASSED*",
+            "*[[]CodeFence#3[]]* FAILED*",
+            "*[[]CodeFence#4[]]* PASSED*",
+            "*line 18, in <module>",
+            "*assert False",
+        ]
+    )
+
+
+def test_concurrent_async_fences_custom_runner(testdir):
+    testdir.makeconftest(
+        """
+import pytest_markdown_docs._runners
+
+@pytest_markdown_docs._runners.register_runner()
+class LinesAreAllFoo(pytest_markdown_docs._runners.DefaultRunner):
+    def runtest(self, test, args):
+        for line in test.source.strip().split("\\n"):
+            assert line == "foo"
+"""
+    )
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python concurrent runner:LinesAreAllFoo
+import asyncio
+await asyncio.sleep(0)
+```
+
+```python concurrent
+import asyncio
+await asyncio.sleep(0)
+```
+""",
+    )
+    # the custom runner runs the fence, rather than a batch of the default runner
+    result = testdir.runpytest("--markdown-docs", "-v")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        ["*[[]CodeFence#1[]]* FAILED*", "*[[]CodeFence#2[]]* PASSED*"]
+    )
+
+
+def test_parallel_safe_fences(testdir):
+    testdir.makeconftest(
+        """
+import threading
+barrier = threading.Barrier(2, timeout=5)
+"""
+    )
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python parallel-safe
+import conftest
+print("first fence")
+conftest.barrier.wait()
+```
+
+```python parallel-safe
+import conftest
+print("second fence")
+conftest.barrier.wait()
+assert False
+```
+
+```python parallel-safe timeout:0.2
+import time
+# threads can't be interrupted, but this one stops on its own after a while
+deadline = time.monotonic() + 2
+while time.monotonic() < deadline:
+    time.sleep(0.01)
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "-v")
+    result.assert_outcomes(passed=1, failed=2)
+    result.stdout.fnmatch_lines(
+        [
+            "*[[]CodeFence#1[]]* PASSED*",
+            "*[[]CodeFence#2[]]* FAILED*",
+            "*[[]CodeFence#3[]]* FAILED*",
+            "*_ [[]CodeFence#2[]]* _*",
+            "*line 11, in <module>",
+            "*- Captured stdout call -*",
+            "second fence",
+            "*_ [[]CodeFence#3[]]* _*",
+            "*FenceTimeout: Code fence timed out after 0.2s while at line * of *",
+        ]
+    )
+    result.stdout.no_fnmatch_line("first fence")
+
+
+def test_parallel_safe_fence_timeout_single_thread(testdir):
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python parallel-safe timeout:0.2
+import time
+deadline = time.monotonic() + 2
+while time.monotonic() < deadline:
+    time.sleep(0.01)
+```
+
+```python parallel-safe timeout:0.2
+assert True
+```
+""",
+    )
+    # the fence after the one that timed out doesn't wait for its thread
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-threads=1", "-v")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        ["*[[]CodeFence#1[]]* FAILED*", "*[[]CodeFence#2[]]* PASSED*"]
+    )
+    assert result.duration < 2
+
+
+def test_parallel_safe_files(testdir):
+    testdir.makeini("[pytest]\nmarkdown_docs_parallel_safe = docs/*.md\n")
+    testdir.makeconftest(
+        """
+import threading
+barrier = threading.Barrier(2, timeout=5)
+"""
+    )
+    testdir.mkdir("docs")
+    testdir.makefile(
+        ".md",
+        **{
+            "docs/test_file": """
+```python
+import conftest
+conftest.barrier.wait()
+```
+
+```python
+import asyncio, conftest
+await asyncio.sleep(0)
+conftest.barrier.wait()
+```
+"""
+        },
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-threads=2")
+    result.assert_outcomes(passed=2)
+
+
+def test_parallel_safe_custom_runner(testdir):
+    testdir.makeini("[pytest]\nmarkdown_docs_parallel_safe = docs/*.md\n")
+    testdir.makeconftest(
+        """
+import pytest_markdown_docs._runners
+
+@pytest_markdown_docs._runners.register_runner()
+class LinesAreAllFoo(pytest_markdown_docs._runners.DefaultRunner):
+    def runtest(self, test, args):
+        for line in test.source.strip().split("\\n"):
+            assert line == "foo"
+"""
+    )
+    testdir.mkdir("docs")
+    testdir.makefile(
+        ".md",
+        **{
+            "docs/test_file": """
+```python runner:LinesAreAllFoo
+assert True
+```
+
+```python runner:LinesAreAllFoo parallel-safe
+assert True
+```
+
+```python
+assert True
+```
+"""
+        },
+    )
+    result = testdir.runpytest("--markdown-docs", "-v")
+    result.assert_outcomes(passed=1, failed=2)
+    result.stdout.fnmatch_lines(
+        [
+            "*[[]CodeFence#1[]]* FAILED*",
+            "*[[]CodeFence#2[]]* FAILED*",
+            "*[[]CodeFence#3[]]* PASSED*",
+        ]
+    )
+
+
+def test_parallel_safe_fences_with_autouse_fixtures(testdir):
+    testdir.makeconftest(
+        """
+import pytest
+
+current = None
+
+@pytest.fixture(autouse=True)
+def set_current(request):
+    global current
+    current = request.node.name
+    yield
+    current = None
+"""
+    )
+    testdir.makefile(
+        ".md",
+        test_file="""
+```python parallel-safe
+import conftest
+assert "CodeFence#1" in conftest.current
+```
+
+```python parallel-safe
+import conftest
+# set up for this fence, so it isn't run along with the first one
+assert "CodeFence#2" in conftest.current
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(passed=2)
+
+
 def test_top_level_await_requires_pytest_asyncio(testdir):
     """Async code blocks should error clearly when pytest-asyncio is not installed."""
     testdir.makeconftest(
@@ -1109,3 +2628,174 @@ await asyncio.sleep(0)
     result = testdir.runpytest("--markdown-docs")
     result.assert_outcomes(failed=1)
     result.stdout.fnmatch_lines(["*pytest-asyncio>=1.1.0*"])
+
+
+def test_include_exclude_patterns(testdir):
+    testdir.makeini(
+        """
+[pytest]
+markdown_docs_include = docs/*
+markdown_docs_exclude =
+    vendor
+    *-draft.md
+markdown_docs_docstring_exclude =
+    vendor
+    generated/*
+"""
+    )
+    failing_fence = "```python\nassert False\n```\n"
+    testdir.mkdir("docs")
+    testdir.mkdir("vendor")
+    testdir.mkdir("generated")
+    testdir.makefile(
+        ".md",
+        **{
+            "docs/guide": "```python\nassert True\n```\n",
+            "docs/guide-draft": failing_fence,
+            "README": failing_fence,
+            "vendor/README": failing_fence,
+        },
+    )
+    testdir.makepyfile(
+        **{
+            "vendor/test_vendored": "def test_regular():\n    pass",
+            "generated/mod": f'"""\n{failing_fence}"""',
+            "generated/test_regular": "def test_regular():\n    pass",
+            "mod": '"""\n```python\nassert True\n```\n"""',
+        }
+    )
+    lines = ["docs/guide.md .*", "generated/test_regular.py .*", "mod.py .*"]
+    for args in [(), ("--markdown-docs-collection-jobs=2",)]:
+        result = testdir.runpytest("--markdown-docs", *args)
+        result.assert_outcomes(passed=4)
+        # the order files are collected in differs between pytest versions
+        for line in lines + ["vendor/test_vendored.py .*"]:
+            result.stdout.fnmatch_lines([line])
+
+    # directories excluded for both kinds of files aren't walked, if enabled
+    testdir.makepyfile(**{"vendor/conftest": "raise Exception('walked')"})
+    result = testdir.runpytest(
+        "--markdown-docs", "-o", "markdown_docs_prune_excluded=true"
+    )
+    result.assert_outcomes(passed=3)
+    for line in lines:
+        result.stdout.fnmatch_lines([line])
+
+
+def test_profile(testdir):
+    testdir.makefile(
+        ".md",
+        """
+```python
+def square(n):
+    return n * n
+
+for i in range(1000):
+    square(i)
+```
+
+```python
+assert False
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-profile=prof")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        ["*markdown-docs profile (top 20 of 2 code fences, profiles in prof)*"]
+    )
+    # frames are listed at the lines of the markdown file
+    result.stdout.fnmatch_lines(["*1000  test_profile.md:2(square)"])
+    result.stdout.fnmatch_lines(["*1  test_profile.md:1(<code fence>)"])
+    profiles = sorted(path.basename for path in testdir.tmpdir.join("prof").listdir())
+    assert len(profiles) == 2
+    assert all(
+        re.match(r"test_profile\.md_[0-9a-f]{12}\.prof$", name) for name in profiles
+    )
+
+
+def test_profile_skips_isolated_fences(testdir):
+    testdir.makefile(
+        ".md",
+        """
+```python
+assert True
+```
+
+```python runner:isolated
+assert True
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs", "--markdown-docs-profile=prof")
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines(
+        ["*markdown-docs profile (top 20 of 1 code fences, profiles in prof)*"]
+    )
+    assert len(testdir.tmpdir.join("prof").listdir()) == 1
+
+
+def test_lifecycle_hooks(testdir):
+    testdir.makeconftest(
+        """
+events = []
+
+
+def pytest_markdown_docs_before_parse(path, start):
+    events.append(f"before_parse {path.name}")
+
+
+def pytest_markdown_docs_after_parse(path, fences, start, duration, exception):
+    assert duration >= 0
+    events.append(f"after_parse {path.name} {[f.start_line for f in fences]}")
+
+
+def pytest_markdown_docs_after_compile(item, start, duration, exception):
+    events.append(f"after_compile {item.start_line} {type(exception).__name__}")
+
+
+def pytest_markdown_docs_before_exec(item, attempt, start):
+    events.append(f"before_exec {item.start_line} {attempt}")
+
+
+def pytest_markdown_docs_after_exec(item, attempt, start, duration, exception):
+    assert start <= start + duration
+    events.append(
+        f"after_exec {item.start_line} {attempt} {type(exception).__name__}"
+    )
+
+
+def pytest_terminal_summary(terminalreporter):
+    for event in events:
+        terminalreporter.write_line(f"event: {event}")
+"""
+    )
+    testdir.makefile(
+        ".md",
+        """
+```python retry:1
+assert False
+```
+
+```python
+def broken(:
+```
+""",
+    )
+    result = testdir.runpytest("--markdown-docs")
+    result.assert_outcomes(failed=2)
+    result.stdout.fnmatch_lines(
+        [
+            "event: before_parse test_lifecycle_hooks.md",
+            "event: after_parse test_lifecycle_hooks.md [1, 5]",
+            "event: after_compile 1 NoneType",
+            "event: before_exec 1 0",
+            "event: after_exec 1 0 AssertionError",
+            "event: before_exec 1 1",
+            "event: after_exec 1 1 AssertionError",
+            # the syntax error is reported when running the fence
+            "event: after_compile 5 SyntaxError",
+            "event: before_exec 5 0",
+            "event: after_exec 5 0 SyntaxError",
+        ]
+    )